@@ -1 +1,4 @@
+# Entrada do gunicorn. Com --preload este módulo é importado uma vez no processo mestre:
+# o pandas (importado sob demanda no servidor) já é carregado aqui para ser compartilhado pelos workers.
+import pandas  # noqa: F401
 from servidor_relatorio_inadimplencia import app as app  # noqa: F401
@@ -1,43 +1,219 @@
-import pandas as pd
+import numpy as np
 import os
+import importlib
 import logging
 import json
 from datetime import datetime, timedelta
-from flask import Flask, render_template_string, request, jsonify, redirect, url_for, send_file
+from dataclasses import dataclass
+from contextlib import contextmanager
+from collections import Counter, OrderedDict
+import hashlib
+from flask import Flask, Response, stream_with_context, render_template_string, request, jsonify, redirect, url_for, send_file
+from flask.json.provider import DefaultJSONProvider
+from jinja2 import Environment
+from markupsafe import Markup
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.pool import ThreadedConnectionPool
 import requests
+from requests.adapters import HTTPAdapter
+import queue
+import shutil
 import threading
-import webbrowser
+import time
+import zlib
+
+try:
+    import orjson  # serialização JSON em Rust; sem ele cai no json da biblioteca padrão
+except ImportError:
+    orjson = None
+try:
+    import fcntl  # trava de arquivo entre processos (workers do gunicorn); não existe no Windows
+except ImportError:
+    fcntl = None
+
+class _ModuloSobDemanda:
+    """Importa o módulo no primeiro acesso a um atributo e troca o global pelo módulo real
+    (os acessos seguintes já não passam por aqui).
+    Serve só à partida local pelo __main__: em produção o app.py importa o pandas antes (gunicorn --preload),
+    então o primeiro acesso já encontra o módulo carregado.
+    """
+    def __init__(self, nome, apelido):
+        self._nome = nome
+        self._apelido = apelido
+
+    def __getattr__(self, atributo):
+        modulo = importlib.import_module(self._nome)
+        globals()[self._apelido] = modulo
+        return getattr(modulo, atributo)
+
+# pandas (~0,3 s de import) só carrega quando uma rota precisa dos dados: no servidor local, /ping, /upload e a
+# página de processamento respondem sem ele e a janela do navegador abre mais cedo
+pd = _ModuloSobDemanda('pandas', 'pd')
 
 # Configuração de logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+def json_bytes(obj, indent=False):
+    """Serializa obj em JSON (UTF-8, sem escapar acentos) usando orjson quando disponível."""
+    if orjson is not None:
+        opcoes = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, option=opcoes)
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None).encode('utf-8')
+
+def json_loads(dados):
+    """Desserializa JSON (str ou bytes) usando orjson quando disponível; erros são ValueError nos dois casos."""
+    return orjson.loads(dados) if orjson is not None else json.loads(dados)
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Provider JSON do Flask (jsonify/request.get_json) via orjson.
+    Mantém chaves ordenadas e delega ao default do Flask o que o orjson não trata igual (datas em formato HTTP, Decimal...).
+    """
+    def dumps(self, obj, **kwargs):
+        # jsonify sempre passa o formato (separators compactos ou indent=2 em debug); só isso é tratado aqui,
+        # qualquer outro argumento vai para o json da biblioteca padrão
+        indent = kwargs.pop('indent', None)
+        kwargs.pop('separators', None)
+        if orjson is None or kwargs:
+            if indent is not None:
+                kwargs['indent'] = indent
+            return super().dumps(obj, **kwargs)
+        opcoes = (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+                  | orjson.OPT_SERIALIZE_NUMPY)
+        if indent:
+            opcoes |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=opcoes).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+
+# Ambiente Jinja para os templates do relatório compilados na importação do módulo
+_JINJA = Environment(autoescape=True)
+
+# Estáticos do relatório versionados pelo conteúdo (?v=hash): a URL muda junto com o arquivo,
+# então o navegador pode mantê-los em cache por um ano sem revalidar
+ESTATICO_MAX_AGE = 31536000
+
+def _versao_estatico(nome):
+    """Hash curto do conteúdo de um arquivo de static/ (usado como ?v= na URL)"""
+    try:
+        with open(os.path.join(app.static_folder, nome), 'rb') as f:
+            return hashlib.blake2b(f.read(), digest_size=8).hexdigest()
+    except OSError as e:
+        logger.warning(f"⚠️ Arquivo estático {nome} indisponível: {e}")
+        return '0'
+
+_VERSAO_JS = _versao_estatico('relatorio.js')
+_VERSAO_CSS = _versao_estatico('relatorio.css')
 
-# Arquivo para salvar observações
-OBSERVACOES_FILE = "observacoes_inadimplencia.json"
+# Arquivo para salvar observações (JSON Lines: um registro por linha, gravação só por append)
+OBSERVACOES_FILE = "observacoes_inadimplencia.jsonl"
+# Formato antigo (lista JSON completa), convertido para JSONL na primeira leitura
+OBSERVACOES_FILE_LEGADO = "observacoes_inadimplencia.json"
+# Trava entre processos das gravações de observações (arquivo à parte: o JSONL pode ser trocado por os.replace)
+OBSERVACOES_LOCK_FILE = OBSERVACOES_FILE + ".lock"
+# Trava entre processos do envio ao Gist (leitura do JSONL + PATCH em ordem, um worker por vez)
+GIST_LOCK_FILE = OBSERVACOES_FILE + ".gist.lock"
 GIST_TOKEN = os.environ.get('GIST_TOKEN') or os.environ.get('GITHUB_TOKEN') or os.environ.get('GH_TOKEN')
 GIST_ID = os.environ.get('GIST_ID')
 GIST_FILENAME = os.environ.get('GIST_FILENAME', 'observacoes_inadimplencia.json')
 
+# Sessão HTTP única para a API do GitHub (keep-alive: evita novo handshake TLS a cada chamada)
+_HTTP = requests.Session()
+_HTTP.headers.update({"Accept": "application/vnd.github+json"})
+_HTTP.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=4))
+
+# Cache das observações do JSONL local (recarregado só quando a assinatura do arquivo muda)
+_OBS_CACHE = {'assinatura': None, 'data': None}
+_OBS_LOCK = threading.Lock()
+
+# Índice das observações por código de cliente, válido para a lista carregada em 'lista' (mesmo objeto)
+_OBS_POR_CLIENTE = {'lista': None, 'indice': {}}
+# Contagem de observações por cliente (badges da tabela), também válida para a lista em 'lista'
+_OBS_CONTAGEM = {'lista': None, 'contagem': Counter()}
+
+# Tabela 'observacoes' já garantida neste processo (evita CREATE TABLE a cada requisição)
+_TABELA_OBSERVACOES_OK = False
+
+# Threads por worker do gunicorn (gthread), as mesmas do Procfile
+THREADS_POR_WORKER = 4
+# Pool de conexões Postgres (criado na primeira conexão; evita handshake TLS por requisição).
+# O putconn fecha as conexões acima do mínimo: com mínimo = threads do worker, requisições simultâneas
+# devolvem as conexões ao pool abertas em vez de reconectar a cada vez
+DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', str(THREADS_POR_WORKER)))
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', '10'))
+_DB_POOL = None
+_DB_POOL_LOCK = threading.Lock()
+
 # Configuração de upload
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'xlsx', 'xls'}
+# Tamanho do bloco na cópia do arquivo enviado para o disco
+UPLOAD_BUFFER = 1024 * 1024
+
+# Normalizações simples de acentos (sem unicodedata para evitar dependência)
+_ACCENT_TABLE = str.maketrans({
+    'Á': 'A', 'Â': 'A', 'Ã': 'A',
+    'É': 'E', 'Ê': 'E',
+    'Í': 'I',
+    'Ó': 'O', 'Ô': 'O', 'Õ': 'O',
+    'Ú': 'U',
+    'Ç': 'C'
+})
+
+# Colunas da aba de inadimplência usadas pelo relatório (nomes da planilha e já mapeados)
+COLUNAS_BASE_INADI = [
+    'RCA', 'VALOR', 'DIAS', 'CLIENTE', 'VENC', 'DUPLIC', 'COD', 'NOME_RCA',
+    'COD_VENDEDOR', 'NOME_VENDEDOR', 'VALOR_TITULO', 'DIAS_ATRASO', 'NOME_CLIENTE', 'COD_CLIENTE',
+    'DATA_VENCIMENTO', 'DATA_EMISSAO', 'DUPLICATA', 'STATUS_TITULO', 'VALOR_PAGO', 'DATA_PAGAMENTO',
+    'OBSERVACOES'
+]
+
+# Tipos das colunas da BASE_INADI na leitura do Excel (evita a inferência célula a célula)
+TIPOS_BASE_INADI = {
+    'RCA': 'string', 'DUPLIC': 'string', 'CLIENTE': 'string', 'NOME_RCA': 'string',
+    'VALOR': 'float64', 'DIAS': 'int32'
+}
+# Colunas de cliente (muito repetidas, viram category na carga) lidas do Parquet como dicionário do Arrow:
+# chegam ao pandas já como Categorical, sem criar um objeto str por linha
+COLUNAS_DICIONARIO_INADI = {'CLIENTE', 'COD', 'NOME_CLIENTE', 'COD_CLIENTE'}
+
+# Cache das planilhas lidas: (caminho, mtime_ns, tamanho) -> (df_inadimplencia, df_rca)
+_EXCEL_CACHE = {}
+
+# Dados processados e métricas do último arquivo: {((caminho, mtime_ns, tamanho), dia): df} e {'entrada': (df, df_metricas)}.
+# Os DataFrames em cache são compartilhados entre requisições e tratados como somente leitura
+# Uma planilha vazia fica em cache como None (por isso o sentinela para "não está no cache")
+_DADOS_CACHE = {}
+_SEM_CACHE = object()
+_METRICAS_CACHE = {}
+
+# Arquivo encontrado na pasta de upload (varredura refeita só quando o mtime da pasta muda)
+_UPLOAD_CACHE = {'mtime': -1, 'path': None}
 
-# Criar pasta de upload se não existir
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
+# Criar pasta de upload se não existir (exist_ok: vários workers podem importar o módulo ao mesmo tempo)
+os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+
+# Troca separadores para o padrão brasileiro (1,234.56 -> 1.234,56) em uma única passada
+_BR_MONEY_TABLE = str.maketrans({',': '.', '.': ','})
+
+# Escape de HTML em uma única passada (texto de células e atributos)
+_HTML_ESCAPE = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'})
 
 def formatar_valor(valor, tipo='moeda'):
     """Formata valores para exibição"""
-    if pd.isna(valor) or valor is None:
+    if valor is None or pd.isna(valor):
         return "R$ 0,00"
     
     try:
         if tipo == 'moeda':
-            return f"R$ {valor:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+            return "R$ " + format(valor, ',.2f').translate(_BR_MONEY_TABLE)
         elif tipo == 'percentual':
             return f"{valor:.2f}%"
         else:
@@ -45,6 +221,45 @@ def formatar_valor(valor, tipo='moeda'):
     except:
         return "R$ 0,00"
 
+def formatar_valor_serie(serie):
+    """Versão vetorizada de formatar_valor (moeda) para uma coluna inteira; vazios viram R$ 0,00."""
+    valores = pd.to_numeric(serie, errors='coerce').fillna(0.0)
+    # Valores em precisão total: resíduos de ponto flutuante abaixo de meio centavo sairiam como "R$ -0,00"
+    valores = valores.mask(valores.abs() < 0.005, 0.0)
+    # Uma única passada em Python sobre a lista crua: evita o .map e o .str.translate do pandas
+    tabela = _BR_MONEY_TABLE
+    return pd.Series(['R$ ' + format(v, ',.2f').translate(tabela) for v in valores.tolist()],
+                     index=valores.index, dtype=object)
+
+def formatar_data_serie(serie):
+    """Versão vetorizada de formatar_data: colunas datetime64 viram texto num cast em C, as demais caem no formatador por célula."""
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        try:
+            if serie.dt.tz is not None:
+                raise TypeError('datas com fuso: o numpy converteria para UTC')
+            return pd.Series(_datas_br(serie.to_numpy(dtype='datetime64[D]')), index=serie.index, dtype=object)
+        except (TypeError, ValueError):
+            return serie.dt.strftime('%d/%m/%Y').fillna('-')
+    return serie.map(formatar_data)
+
+def _datas_br(dias):
+    """datetime64[D] -> 'dd/mm/aaaa' sem strftime por elemento: o cast para 'AAAA-MM-DD' é feito pelo numpy
+    e os bytes de cada texto são reordenados de uma vez. NaT vira '-'.
+    """
+    nulos = np.isnat(dias)
+    validos = dias[~nulos]
+    if len(validos) and (validos.min() < np.datetime64('1000-01-01') or validos.max() > np.datetime64('9999-12-31')):
+        raise ValueError('ano fora de 4 dígitos')
+    iso = dias.astype('S10').view(np.uint8).reshape(-1, 10)
+    br = np.empty_like(iso)
+    br[:, 0:2] = iso[:, 8:10]
+    br[:, 3:5] = iso[:, 5:7]
+    br[:, 6:10] = iso[:, 0:4]
+    br[:, [2, 5]] = ord('/')
+    textos = br.view('S10').ravel().astype(str).astype(object)
+    textos[nulos] = '-'
+    return textos
+
 def formatar_data(valor):
     """Formata datas para dd/mm/aaaa, removendo horário quando houver."""
     try:
@@ -83,80 +298,315 @@ def get_color_atingimento(percentual):
     except:
         return "#666666"  # Cinza para erros
 
+# Tabela de cores para a versão vetorizada: limites inclusivos (até 5%, até 10%, ...) e uma cor por faixa
+_CORES_LIMITES = np.array([5, 10, 15, 20], dtype=float)
+_CORES_FAIXAS = np.array(["#00FF00", "#90EE90", "#FFFF00", "#FFA500", "#FF0000"], dtype=object)
+
+def cores_atingimento_serie(percentuais):
+    """Versão vetorizada de get_color_atingimento: um np.searchsorted sobre a coluna inteira; nulos ficam cinza."""
+    valores = pd.to_numeric(pd.Series(percentuais), errors='coerce').to_numpy(dtype=float)
+    cores = _CORES_FAIXAS[np.searchsorted(_CORES_LIMITES, valores, side='left')]
+    cores[np.isnan(valores)] = "#666666"
+    return cores
+
+# Classificação do resumo por % de inadimplência: até 10% BOM, até 20% MÉDIO, acima disso RUIM
+_STATUS_LIMITES = np.array([10, 20], dtype=float)
+_STATUS_RESUMO = np.array(['BOM', 'MÉDIO', 'RUIM'], dtype=object)
+
+# Status do título no detalhamento, indexado por "em aberto" (0 = pago parcial, 1 = em aberto)
+_STATUS_TITULO_CLASSE = np.array(['status-medio', 'status-ruim'], dtype=object)
+_STATUS_TITULO_TEXTO = np.array(['PAGO PARCIAL', 'EM ABERTO'], dtype=object)
+
 def allowed_file(filename):
     """Verifica se a extensão do arquivo é permitida"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def obter_dados_inadimplencia():
+def localizar_arquivo_upload():
+    """Retorna o Excel de inadimplência da pasta de upload (ou None se não houver).
+    Adicionar/remover arquivos altera o mtime da pasta, então a varredura só é refeita nesses casos.
+    """
+    try:
+        mtime = os.stat(UPLOAD_FOLDER).st_mtime_ns
+    except OSError:
+        return None
+    caminho = _UPLOAD_CACHE['path']
+    if _UPLOAD_CACHE['mtime'] == mtime and (caminho is None or os.path.exists(caminho)):
+        return caminho
+    caminho = None
+    with os.scandir(UPLOAD_FOLDER) as entradas:
+        for entrada in entradas:
+            # is_file() usa o tipo devolvido pela listagem do diretório (sem stat por entrada)
+            name_upper = entrada.name.upper()
+            if (allowed_file(entrada.name) and ('INADIMPLENCIA GERAL' in name_upper or 'RESUMO_VENDAS' in name_upper)
+                    and entrada.is_file()):
+                caminho = entrada.path
+                break
+    _UPLOAD_CACHE['mtime'] = mtime
+    _UPLOAD_CACHE['path'] = caminho
+    return caminho
+
+def assinatura_arquivo(caminho):
+    """(caminho, mtime em ns, tamanho): muda a cada nova gravação, mesmo dentro do mesmo segundo"""
+    st = os.stat(caminho)
+    return (caminho, st.st_mtime_ns, st.st_size)
+
+def localizar_arquivo_inadimplencia():
+    """Excel de inadimplência a usar: o da pasta de upload ou, na falta dele, o do diretório raiz (None se não houver)."""
+    arquivo_excel = localizar_arquivo_upload()
+    if arquivo_excel:
+        return arquivo_excel
+    for nome in ("INADIMPLENCIA GERAL.xlsx", "RESUMO_VENDAS.xlsx"):
+        if os.path.exists(nome):
+            return nome
+    return None
+
+def _norm(texto):
+    """Normaliza nome de aba para comparação: maiúsculas, sem acentos, espaços ou '_'"""
+    return str(texto).strip().upper().translate(_ACCENT_TABLE).replace(' ', '').replace('_', '')
+
+def _caminho_parquet(arquivo_excel, aba):
+    """Caminho do Parquet de uma aba: <arquivo>.<aba>.parquet"""
+    return f"{os.path.splitext(arquivo_excel)[0]}.{aba}.parquet"
+
+def _caminho_manifesto_parquet(arquivo_excel):
+    """Manifesto com as abas convertidas (gravado por último, marca conversão completa)"""
+    return f"{os.path.splitext(arquivo_excel)[0]}.abas.json"
+
+def _caminho_temporario(destino):
+    """Arquivo temporário exclusivo deste processo/thread, renomeado sobre `destino` ao final da gravação"""
+    return f"{destino}.{os.getpid()}-{threading.get_ident()}.tmp"
+
+def _ler_manifesto_parquet(arquivo_excel):
+    """Retorna as abas do manifesto Parquet se ele foi gerado a partir desta versão do Excel.
+    A versão é a assinatura (mtime em ns, tamanho) gravada na conversão, não a comparação de mtimes:
+    um Excel trocado por outro com data antiga (cópia preservando mtime) não reaproveita Parquet velho.
+    """
+    manifesto = _caminho_manifesto_parquet(arquivo_excel)
+    try:
+        if not os.path.exists(manifesto):
+            return None
+        with open(manifesto, 'rb') as f:
+            dados = json_loads(f.read())
+        # Manifesto antigo (só a lista de abas, sem assinatura) é tratado como desatualizado
+        if not isinstance(dados, dict) or dados.get('excel') != list(assinatura_arquivo(arquivo_excel)[1:]):
+            return None
+        abas = dados['abas']
+        if not all(os.path.exists(_caminho_parquet(arquivo_excel, a['nome'])) for a in abas):
+            return None
+        return abas
+    except Exception as e:
+        logger.warning(f"⚠️ Manifesto Parquet inválido: {e}")
+        return None
+
+def abrir_excel(arquivo_excel):
+    """Abre o Excel com o leitor calamine (Rust, lê .xlsx e .xls); se não estiver instalado
+    ou não conseguir abrir o arquivo, usa o engine padrão do pandas.
+    """
+    try:
+        return pd.ExcelFile(arquivo_excel, engine='calamine')
+    except Exception as e:
+        logger.warning(f"⚠️ Engine calamine indisponível ({e}); usando engine padrão")
+        return pd.ExcelFile(arquivo_excel)
+
+def _coluna_base_inadi(coluna):
+    """Filtro de usecols da aba de inadimplência"""
+    return str(coluna) in COLUNAS_BASE_INADI
+
+def _coluna_base_rca(coluna):
+    """Filtro de usecols da aba de RCA (mesmas palavras-chave da heurística de unificação)"""
+    cu = str(coluna).upper()
+    return any(k in cu for k in ('RCA', 'COD', 'NOME', 'MESMO', 'VEND'))
+
+def _ler_aba_excel(xls, aba, usecols=None, dtype=None):
+    """Lê uma aba do Excel decodificando só as colunas pedidas, já com os tipos certos.
+    Se os tipos numéricos não baterem com o conteúdo (ex.: DIAS vazio), relê mantendo só os de texto.
+    """
+    try:
+        return pd.read_excel(xls, sheet_name=aba, usecols=usecols, dtype=dtype)
+    except (ValueError, TypeError) as e:
+        if dtype is None:
+            raise
+        logger.warning(f"⚠️ Tipos fora do padrão na aba '{aba}' ({e}); inferindo colunas numéricas")
+        tipos_texto = {c: t for c, t in dtype.items() if t == 'string'}
+        return pd.read_excel(xls, sheet_name=aba, usecols=usecols, dtype=tipos_texto or None)
+
+def converter_excel_para_parquet(arquivo_excel, xls, opcoes_por_aba=None, abas_usadas=None):
+    """Materializa as abas do Excel em Parquet (zstd) para as leituras seguintes.
+
+    `opcoes_por_aba` restringe colunas/tipos por aba ({aba: {'usecols': ..., 'dtype': ...}}).
+    `abas_usadas` limita a conversão a essas abas (as demais nem são decodificadas).
+    Retorna o manifesto [{'nome': aba, 'colunas': [...]}] ou None se a conversão falhar.
+    """
+    try:
+        # Assinatura lida antes de decodificar: se o Excel mudar durante a conversão, o manifesto já nasce velho
+        assinatura = list(assinatura_arquivo(arquivo_excel)[1:])
+        opcoes_por_aba = opcoes_por_aba or {}
+        abas = []
+        for aba in xls.sheet_names:
+            if abas_usadas is not None and str(aba) not in abas_usadas:
+                continue
+            df = _ler_aba_excel(xls, aba, **opcoes_por_aba.get(str(aba), {}))
+            # Parquet exige nomes de coluna string
+            df.columns = [str(c) for c in df.columns]
+            for c in df.columns[df.dtypes == object]:
+                # Colunas com tipos mistos (ex.: números e textos) viram texto
+                try:
+                    tipo_ok = pd.api.types.infer_dtype(df[c], skipna=True) not in ('mixed', 'mixed-integer')
+                except Exception:
+                    tipo_ok = False
+                if not tipo_ok:
+                    df[c] = df[c].where(df[c].isna(), df[c].astype(str))
+            # Grava em temporário e renomeia: outro worker convertendo o mesmo upload nunca lê um Parquet pela metade
+            destino = _caminho_parquet(arquivo_excel, aba)
+            tmp = _caminho_temporario(destino)
+            df.to_parquet(tmp, engine='pyarrow', compression='zstd', index=False)
+            os.replace(tmp, destino)
+            abas.append({'nome': str(aba), 'colunas': list(df.columns)})
+        destino = _caminho_manifesto_parquet(arquivo_excel)
+        tmp = _caminho_temporario(destino)
+        with open(tmp, 'wb') as f:
+            f.write(json_bytes({'excel': assinatura, 'abas': abas}))
+        os.replace(tmp, destino)
+        logger.info(f"🗜️ {len(abas)} aba(s) convertida(s) para Parquet: {arquivo_excel}")
+        return abas
+    except Exception as e:
+        logger.warning(f"⚠️ Falha ao converter Excel para Parquet (lendo direto do Excel): {e}")
+        return None
+
+def carregar_planilhas(arquivo_excel):
+    """Lê as abas de inadimplência e de RCA, reaproveitando o cache enquanto o arquivo não mudar.
+
+    A leitura passa pelo Parquet gerado a partir do Excel; o Excel só é lido na conversão.
+    Retorna (df_inadimplencia, df_rca); df_rca é None se a aba de RCA não puder ser lida.
+    """
+    chave = assinatura_arquivo(arquivo_excel)
+    if chave in _EXCEL_CACHE:
+        df_inadi, df_rca = _EXCEL_CACHE[chave]
+        # Cópia para que o processamento posterior não altere o cache
+        return df_inadi.copy(), df_rca
+    
+    manifesto = _ler_manifesto_parquet(arquivo_excel)
+    if manifesto:
+        abas_disponiveis = [a['nome'] for a in manifesto]
+    else:
+        # Um único handle do arquivo para todas as abas (evita reabrir o zip)
+        xls = abrir_excel(arquivo_excel)
+        abas_disponiveis = [str(s) for s in xls.sheet_names]
+    
+    mapa_norm_para_original = {_norm(n): n for n in abas_disponiveis}
+    candidatos_inadi = ['BASEINADI','BASEINAD','BASEINADIMPLENCIA','INADIMPLENCIA','INADIMPLENCIA','INAD']
+    aba_inadi = None
+    for cand in candidatos_inadi:
+        if cand in mapa_norm_para_original:
+            aba_inadi = mapa_norm_para_original[cand]
+            break
+    if aba_inadi is None:
+        # fallback: primeira aba
+        aba_inadi = abas_disponiveis[0]
+        logger.warning(f"⚠️ Aba 'BASE_INADI' não encontrada. Usando aba '{aba_inadi}'. Abas disponíveis: {abas_disponiveis}")
+    else:
+        logger.info(f"➡️ Aba de inadimplência selecionada: {aba_inadi}")
+    
+    # Detectar aba de RCA de forma robusta
+    candidatos_rca = ['BASERCA','RCA','BASEVENDEDOR','VENDEDORES','VENDEDOR','RCABASE']
+    aba_rca = None
+    for cand in candidatos_rca:
+        if cand in mapa_norm_para_original:
+            aba_rca = mapa_norm_para_original[cand]
+            break
+    if aba_rca is None:
+        aba_rca = 'BASE_RCA'  # tentativa padrão (pode falhar)
+    
+    # Só as colunas usadas pelo relatório são decodificadas do Excel
+    opcoes_por_aba = {
+        aba_inadi: {'usecols': _coluna_base_inadi, 'dtype': TIPOS_BASE_INADI},
+        aba_rca: {'usecols': _coluna_base_rca},
+    }
+    if not manifesto:
+        # Só as abas de inadimplência e de RCA: outras abas da planilha não são usadas pelo relatório
+        manifesto = converter_excel_para_parquet(arquivo_excel, xls, opcoes_por_aba, abas_usadas=set(opcoes_por_aba))
+    if manifesto:
+        colunas_por_aba = {a['nome']: a['colunas'] for a in manifesto}
+        def ler_aba(aba, colunas=None):
+            if aba not in colunas_por_aba:
+                raise ValueError(f"aba '{aba}' inexistente")
+            if colunas is not None:
+                colunas = [c for c in colunas_por_aba[aba] if c in colunas] or None
+            dicionario = [c for c in (colunas or colunas_por_aba[aba]) if c in COLUNAS_DICIONARIO_INADI] if aba == aba_inadi else []
+            df = pd.read_parquet(_caminho_parquet(arquivo_excel, aba), engine='pyarrow', columns=colunas,
+                                 read_dictionary=dicionario or None)
+            # O dicionário do Arrow vem na ordem de aparição; categorias em ordem alfabética, como astype('category'),
+            # mantêm as ordenações por essas colunas iguais às do texto (colunas não textuais são lidas normalmente)
+            for c in dicionario:
+                if isinstance(df[c].dtype, pd.CategoricalDtype):
+                    df[c] = df[c].cat.set_categories(df[c].cat.categories.sort_values())
+            return df
+    else:
+        def ler_aba(aba, colunas=None):
+            return _ler_aba_excel(xls, aba, **opcoes_por_aba.get(aba, {}))
+    
+    df_inadi = ler_aba(aba_inadi, COLUNAS_BASE_INADI)
+    try:
+        df_rca = ler_aba(aba_rca)
+    except Exception as e:
+        logger.warning(f"⚠️ Aba de RCA '{aba_rca}' indisponível: {e}")
+        df_rca = None
+    
+    # Manter apenas a versão mais recente do arquivo em memória
+    _EXCEL_CACHE.clear()
+    _EXCEL_CACHE[chave] = (df_inadi, df_rca)
+    return df_inadi.copy(), df_rca
+
+@dataclass(frozen=True, slots=True)
+class Periodo:
+    """Momento da requisição e janela de análise do relatório"""
+    hoje: datetime
+    inicio: datetime
+    fim: datetime
+
+def periodo_relatorio(agora=None):
+    """Calcula o período uma vez por requisição (dados, cache e HTML usam o mesmo, mesmo virando a meia-noite)."""
+    # Calcular período dinâmico: mês atual, dia atual menos 1
+    hoje = agora or datetime.now()
+    # Data fim: dia atual menos 1
+    data_fim = hoje - timedelta(days=1)
+    # Data início: mesma data (dia e mês) porém 1 ano antes
+    try:
+        data_inicio = data_fim.replace(year=data_fim.year - 1)
+    except ValueError:
+        # Trata 29/02 -> 28/02 do ano anterior
+        data_inicio = (data_fim - timedelta(days=1)).replace(year=(data_fim - timedelta(days=1)).year - 1)
+    return Periodo(hoje=hoje, inicio=data_inicio, fim=data_fim)
+
+def obter_dados_inadimplencia(periodo=None):
     """Obtém dados de inadimplência do período especificado"""
     try:
-        # Calcular período dinâmico: mês atual, dia atual menos 1
-        hoje = datetime.now()
-        dia_atual_menos_1 = hoje - timedelta(days=1)
-        
-        # Data fim: dia atual menos 1
-        data_fim = dia_atual_menos_1
-        # Data início: mesma data (dia e mês) porém 1 ano antes
-        try:
-            data_inicio = data_fim.replace(year=data_fim.year - 1)
-        except ValueError:
-            # Trata 29/02 -> 28/02 do ano anterior
-            data_inicio = (data_fim - timedelta(days=1)).replace(year=(data_fim - timedelta(days=1)).year - 1)
+        periodo = periodo or periodo_relatorio()
+        hoje, data_inicio, data_fim = periodo.hoje, periodo.inicio, periodo.fim
         
         logger.info(f"📅 Buscando dados de inadimplência de {data_inicio.strftime('%d/%m/%Y')} até {data_fim.strftime('%d/%m/%Y')}")
         
         # Verificar se o arquivo existe (primeiro na pasta uploads, depois no diretório raiz)
-        arquivo_excel = None
-        
-        # Procurar na pasta uploads (novo nome preferencial)
-        for filename in os.listdir(UPLOAD_FOLDER):
-            name_upper = filename.upper()
-            if allowed_file(filename) and ('INADIMPLENCIA GERAL' in name_upper or 'RESUMO_VENDAS' in name_upper):
-                arquivo_excel = os.path.join(UPLOAD_FOLDER, filename)
-                break
-        
-        # Se não encontrou na pasta uploads, procurar no diretório raiz
+        arquivo_excel = localizar_arquivo_inadimplencia()
         if not arquivo_excel:
-            if os.path.exists("INADIMPLENCIA GERAL.xlsx"):
-                arquivo_excel = "INADIMPLENCIA GERAL.xlsx"
-            elif os.path.exists("RESUMO_VENDAS.xlsx"):
-                arquivo_excel = "RESUMO_VENDAS.xlsx"
-            else:
-                logger.error(f"❌ Arquivo INADIMPLENCIA GERAL.xlsx não encontrado")
-                logger.info("💡 Faça upload do arquivo Excel na página inicial")
-                return None
+            logger.error(f"❌ Arquivo INADIMPLENCIA GERAL.xlsx não encontrado")
+            logger.info("💡 Faça upload do arquivo Excel na página inicial")
+            return None
         
-        # Carregar dados da planilha (detectar a aba correta de forma robusta)
-        xls = pd.ExcelFile(arquivo_excel)
-        abas_disponiveis = [str(s) for s in xls.sheet_names]
-        def _norm(texto):
-            t = str(texto).strip().upper()
-            # normalizações simples (sem unicodedata para evitar dependência)
-            t = (t.replace('Á','A').replace('Â','A').replace('Ã','A')
-                   .replace('É','E').replace('Ê','E')
-                   .replace('Í','I')
-                   .replace('Ó','O').replace('Ô','O').replace('Õ','O')
-                   .replace('Ú','U')
-                   .replace('Ç','C'))
-            t = t.replace(' ', '').replace('_','')
-            return t
-        mapa_norm_para_original = {_norm(n): n for n in abas_disponiveis}
-        candidatos_inadi = ['BASEINADI','BASEINAD','BASEINADIMPLENCIA','INADIMPLENCIA','INADIMPLENCIA','INAD']
-        aba_inadi = None
-        for cand in candidatos_inadi:
-            if cand in mapa_norm_para_original:
-                aba_inadi = mapa_norm_para_original[cand]
-                break
-        if aba_inadi is None:
-            # fallback: primeira aba
-            aba_inadi = abas_disponiveis[0]
-            logger.warning(f"⚠️ Aba 'BASE_INADI' não encontrada. Usando aba '{aba_inadi}'. Abas disponíveis: {abas_disponiveis}")
-        else:
-            logger.info(f"➡️ Aba de inadimplência selecionada: {aba_inadi}")
-        df_inadimplencia = pd.read_excel(arquivo_excel, sheet_name=aba_inadi)
+        # Mesmo arquivo (mtime) no mesmo dia => mesmo resultado (o vencimento estimado depende da data de hoje)
+        chave_dados = (assinatura_arquivo(arquivo_excel), hoje.date())
+        em_cache = _DADOS_CACHE.get(chave_dados, _SEM_CACHE)
+        if em_cache is not _SEM_CACHE:
+            return em_cache
+        
+        # Carregar dados da planilha (cacheado pela assinatura do arquivo)
+        df_inadimplencia, df_rca = carregar_planilhas(arquivo_excel)
         
         if df_inadimplencia.empty:
             logger.warning("⚠️ Aba BASE_INADI está vazia")
+            # Sai antes de qualquer normalização e memoriza o resultado até o arquivo mudar
+            _DADOS_CACHE.clear()
+            _DADOS_CACHE[chave_dados] = None
             return None
         
         # Verificar colunas disponíveis
@@ -175,99 +625,82 @@ def obter_dados_inadimplencia():
                 'COD': 'COD_CLIENTE'
             })
         
-        # Adicionar colunas que podem não existir
+        # Adicionar colunas que podem não existir (presença consultada num set, atualizado a cada coluna criada)
+        cols = set(df_inadimplencia.columns)
         # Garantir que o valor do título venha da coluna 'VALOR' da planilha
         try:
-            if 'VALOR_TITULO' not in df_inadimplencia.columns and 'VALOR' in df_inadimplencia.columns:
+            if 'VALOR_TITULO' not in cols and 'VALOR' in cols:
                 df_inadimplencia['VALOR_TITULO'] = df_inadimplencia['VALOR']
+                cols.add('VALOR_TITULO')
             # Coagir a numérico para evitar None/NaN na exibição
-            if 'VALOR_TITULO' in df_inadimplencia.columns:
+            if 'VALOR_TITULO' in cols:
                 df_inadimplencia['VALOR_TITULO'] = pd.to_numeric(df_inadimplencia['VALOR_TITULO'], errors='coerce').fillna(0.0)
         except Exception:
             pass
+        # Vencimento em texto/objeto vira datetime64 uma vez na carga (como um parse_dates), se todas as datas
+        # forem reconhecidas; assim a renderização usa .dt.strftime em vez de interpretar célula a célula
+        try:
+            if 'DATA_VENCIMENTO' in cols and not pd.api.types.is_datetime64_any_dtype(df_inadimplencia['DATA_VENCIMENTO']):
+                _dv = pd.to_datetime(df_inadimplencia['DATA_VENCIMENTO'], errors='coerce')
+                if _dv.notna().sum() == df_inadimplencia['DATA_VENCIMENTO'].notna().sum():
+                    df_inadimplencia['DATA_VENCIMENTO'] = _dv
+        except Exception:
+            pass
         # Calcular Data Emissão se ausente (Vencimento - Dias de Atraso)
         try:
-            if 'DATA_EMISSAO' not in df_inadimplencia.columns and 'DATA_VENCIMENTO' in df_inadimplencia.columns and 'DIAS_ATRASO' in df_inadimplencia.columns:
+            if 'DATA_EMISSAO' not in cols and 'DATA_VENCIMENTO' in cols and 'DIAS_ATRASO' in cols:
                 _dv = pd.to_datetime(df_inadimplencia['DATA_VENCIMENTO'], errors='coerce')
                 _dias = pd.to_numeric(df_inadimplencia['DIAS_ATRASO'], errors='coerce').fillna(0)
                 df_inadimplencia['DATA_EMISSAO'] = _dv - pd.to_timedelta(_dias, unit='D')
+                cols.add('DATA_EMISSAO')
         except Exception:
             pass
-        if 'NOME_VENDEDOR' not in df_inadimplencia.columns:
-            if 'NOME_RCA' in df_inadimplencia.columns:
+        # Código do vendedor como texto uma única vez; cod_str é reutilizado abaixo sem novos astype
+        cod_str = df_inadimplencia['COD_VENDEDOR'].astype('string').fillna('')
+        df_inadimplencia['COD_VENDEDOR'] = cod_str
+
+        if 'NOME_VENDEDOR' not in cols:
+            if 'NOME_RCA' in cols:
                 df_inadimplencia['NOME_VENDEDOR'] = df_inadimplencia['NOME_RCA']
             else:
-                df_inadimplencia['NOME_VENDEDOR'] = 'Vendedor ' + df_inadimplencia['COD_VENDEDOR'].astype(str)
+                df_inadimplencia['NOME_VENDEDOR'] = 'Vendedor ' + cod_str
+            cols.add('NOME_VENDEDOR')
         
-        if 'COD_CLIENTE' not in df_inadimplencia.columns:
+        if 'COD_CLIENTE' not in cols:
             df_inadimplencia['COD_CLIENTE'] = 'Cliente'
+            cols.add('COD_CLIENTE')
         
-        if 'NOME_CLIENTE' not in df_inadimplencia.columns:
+        if 'NOME_CLIENTE' not in cols:
             df_inadimplencia['NOME_CLIENTE'] = 'Cliente'
+            cols.add('NOME_CLIENTE')
         
-        if 'DATA_VENCIMENTO' not in df_inadimplencia.columns:
-            # Calcular data de vencimento baseada nos dias de atraso
-            df_inadimplencia['DATA_VENCIMENTO'] = (hoje - pd.to_timedelta(df_inadimplencia['DIAS_ATRASO'], unit='D')).dt.strftime('%Y-%m-%d')
+        if 'DATA_VENCIMENTO' not in cols:
+            # Calcular data de vencimento baseada nos dias de atraso (mantida como datetime64;
+            # o texto dd/mm/aaaa só é gerado na renderização)
+            df_inadimplencia['DATA_VENCIMENTO'] = pd.Timestamp(hoje).normalize() - pd.to_timedelta(df_inadimplencia['DIAS_ATRASO'].to_numpy(), unit='D')
+            cols.add('DATA_VENCIMENTO')
         
-        if 'STATUS_TITULO' not in df_inadimplencia.columns:
+        if 'STATUS_TITULO' not in cols:
             df_inadimplencia['STATUS_TITULO'] = 'EM ABERTO'
+            cols.add('STATUS_TITULO')
         
-        if 'VALOR_PAGO' not in df_inadimplencia.columns:
-            df_inadimplencia['VALOR_PAGO'] = 0
+        if 'VALOR_PAGO' not in cols:
+            df_inadimplencia['VALOR_PAGO'] = 0.0
+            cols.add('VALOR_PAGO')
         
-        if 'DATA_PAGAMENTO' not in df_inadimplencia.columns:
+        if 'DATA_PAGAMENTO' not in cols:
             df_inadimplencia['DATA_PAGAMENTO'] = None
+            cols.add('DATA_PAGAMENTO')
         
-        if 'OBSERVACOES' not in df_inadimplencia.columns:
+        if 'OBSERVACOES' not in cols:
             df_inadimplencia['OBSERVACOES'] = ''
         
-        # Unificar nomes de vendedores pela BASE_RCA (um vendedor com 2 RCAs)
-        try:
-            # Detectar aba de RCA de forma robusta
-            candidatos_rca = ['BASERCA','RCA','BASEVENDEDOR','VENDEDORES','VENDEDOR','RCABASE']
-            aba_rca = None
-            for cand in candidatos_rca:
-                if cand in mapa_norm_para_original:
-                    aba_rca = mapa_norm_para_original[cand]
-                    break
-            if aba_rca is None:
-                aba_rca = 'BASE_RCA'  # tentativa padrão (pode falhar e cair no except)
-            df_rca = pd.read_excel(arquivo_excel, sheet_name=aba_rca)
-            if 'RCA' in df_rca.columns and 'NOME_RCA' in df_rca.columns:
-                df_rca = df_rca[['RCA', 'NOME_RCA']].copy()
-                df_rca['RCA'] = df_rca['RCA'].astype(str)
-                df_rca['NOME_RCA'] = df_rca['NOME_RCA'].astype(str)
-                mapa_rca_nome = dict(zip(df_rca['RCA'], df_rca['NOME_RCA']))
-            elif 'COD' in df_rca.columns and 'NOME' in df_rca.columns:
-                df_rca = df_rca[['COD', 'NOME']].copy()
-                df_rca['COD'] = df_rca['COD'].astype(str)
-                df_rca['NOME'] = df_rca['NOME'].astype(str)
-                mapa_rca_nome = dict(zip(df_rca['COD'], df_rca['NOME']))
-            else:
-                mapa_rca_nome = {}
-                logger.warning("⚠️ BASE_RCA sem colunas padrão; mantendo nomes originais")
-
-            if mapa_rca_nome:
-                df_inadimplencia['NOME_VENDEDOR'] = df_inadimplencia.apply(
-                    lambda r: mapa_rca_nome.get(str(r['COD_VENDEDOR']), r['NOME_VENDEDOR']), axis=1
-                )
-        except Exception as _:
-            pass
-
         # ================================
         # Unificação por BASE_RCA (um vendedor com 2 RCAs)
         # ================================
         try:
-            # Detectar aba de RCA novamente (reutilizar heurística)
-            candidatos_rca = ['BASERCA','RCA','BASEVENDEDOR','VENDEDORES','VENDEDOR','RCABASE']
-            aba_rca = None
-            for cand in candidatos_rca:
-                if cand in mapa_norm_para_original:
-                    aba_rca = mapa_norm_para_original[cand]
-                    break
-            if aba_rca is None:
-                aba_rca = 'BASE_RCA'
-            df_rca = pd.read_excel(arquivo_excel, sheet_name=aba_rca)
+            if df_rca is None:
+                raise ValueError("aba BASE_RCA indisponível")
             # Mapear nomes das colunas com heurística (tolerante a variações)
             colmap = {}
             for c in df_rca.columns:
@@ -300,8 +733,10 @@ def obter_dados_inadimplencia():
                 if col_mesmo_cod is not None and col_mesmo_vend is not None:
                     df_r[col_mesmo_cod] = df_r[col_mesmo_cod].astype(str)
                     df_r[col_mesmo_vend] = df_r[col_mesmo_vend].astype(str)
-                    mapa_rca_para_cod = dict(zip(df_r[col_rca], df_r[col_mesmo_cod]))
-                    mapa_rca_para_nome = dict(zip(df_r[col_rca], df_r[col_mesmo_vend]))
+                    # Colunas como listas: zip sobre listas não passa pelo iterador de Series a cada linha
+                    rcas = df_r[col_rca].tolist()
+                    mapa_rca_para_cod = dict(zip(rcas, df_r[col_mesmo_cod].tolist()))
+                    mapa_rca_para_nome = dict(zip(rcas, df_r[col_mesmo_vend].tolist()))
                 else:
                     # Fallback: unificar por nome (mesmo NOME_RCA => mesmo vendedor)
                     if col_nome is not None:
@@ -309,95 +744,313 @@ def obter_dados_inadimplencia():
                         # escolher um código pivot por nome (primeiro)
                         pivots = df_r.groupby(col_nome)[col_rca].first()
                         mapa_nome_para_cod = pivots.to_dict()
-                        mapa_rca_para_cod = {rca: mapa_nome_para_cod.get(nome, rca) for rca, nome in zip(df_r[col_rca], df_r[col_nome])}
-                        mapa_rca_para_nome = dict(zip(df_r[col_rca], df_r[col_nome]))
+                        rcas, nomes = df_r[col_rca].tolist(), df_r[col_nome].tolist()
+                        mapa_rca_para_cod = {rca: mapa_nome_para_cod.get(nome, rca) for rca, nome in zip(rcas, nomes)}
+                        mapa_rca_para_nome = dict(zip(rcas, nomes))
 
             # Aplicar mapeamento sobre a base de inadimplência
             if mapa_rca_para_nome:
-                df_inadimplencia['COD_UNIFICADO'] = df_inadimplencia['COD_VENDEDOR'].astype(str).map(mapa_rca_para_cod).fillna(df_inadimplencia['COD_VENDEDOR'].astype(str))
-                df_inadimplencia['NOME_UNIFICADO'] = df_inadimplencia['COD_VENDEDOR'].astype(str).map(mapa_rca_para_nome).fillna(df_inadimplencia['NOME_VENDEDOR'])
+                # Um único merge traz código e nome unificados de uma vez (em vez de dois .map)
+                df_map = pd.DataFrame({
+                    '_COD_RCA': list(mapa_rca_para_cod),
+                    'COD_UNIFICADO': list(mapa_rca_para_cod.values()),
+                    'NOME_UNIFICADO': [mapa_rca_para_nome.get(k) for k in mapa_rca_para_cod],
+                })
+                df_map['_COD_RCA'] = df_map['_COD_RCA'].astype('string')
+                df_inadimplencia = df_inadimplencia.merge(df_map, left_on='COD_VENDEDOR', right_on='_COD_RCA', how='left')
+                if col_mesmo_vend is None:
+                    # Sem MESMO_VEND o mapa é RCA -> nome da BASE_RCA; refletir também no nome do vendedor
+                    df_inadimplencia['NOME_VENDEDOR'] = df_inadimplencia['NOME_UNIFICADO'].fillna(df_inadimplencia['NOME_VENDEDOR'])
+                df_inadimplencia['COD_UNIFICADO'] = df_inadimplencia['COD_UNIFICADO'].fillna(df_inadimplencia['COD_VENDEDOR'])
+                df_inadimplencia['NOME_UNIFICADO'] = df_inadimplencia['NOME_UNIFICADO'].fillna(df_inadimplencia['NOME_VENDEDOR'])
+                df_inadimplencia = df_inadimplencia.drop(columns='_COD_RCA')
             else:
-                df_inadimplencia['COD_UNIFICADO'] = df_inadimplencia['COD_VENDEDOR'].astype(str)
+                logger.warning("⚠️ BASE_RCA sem colunas padrão; mantendo nomes originais")
+                df_inadimplencia['COD_UNIFICADO'] = df_inadimplencia['COD_VENDEDOR']
                 df_inadimplencia['NOME_UNIFICADO'] = df_inadimplencia['NOME_VENDEDOR']
         except Exception as _:
-            df_inadimplencia['COD_UNIFICADO'] = df_inadimplencia['COD_VENDEDOR'].astype(str)
+            df_inadimplencia['COD_UNIFICADO'] = df_inadimplencia['COD_VENDEDOR']
             df_inadimplencia['NOME_UNIFICADO'] = df_inadimplencia['NOME_VENDEDOR']
 
+        # Chaves de agrupamento como categoria: o groupby passa a hashear só os códigos únicos.
+        # Cliente (código e nome) também se repete muito: categoria reduz memória e deixa
+        # ordenação/formatação do detalhamento trabalharem sobre os códigos
+        for c in ('COD_UNIFICADO', 'NOME_UNIFICADO', 'COD_VENDEDOR', 'NOME_VENDEDOR', 'COD_CLIENTE', 'NOME_CLIENTE'):
+            if c in df_inadimplencia.columns:
+                df_inadimplencia[c] = df_inadimplencia[c].astype('category')
+        # Valores monetários em float64 (float32 arredondaria centavos em totais grandes)
+        for c in ('VALOR_TITULO', 'VALOR_PAGO'):
+            if c in df_inadimplencia.columns and df_inadimplencia[c].dtype != 'float64':
+                df_inadimplencia[c] = pd.to_numeric(df_inadimplencia[c], errors='coerce').astype('float64')
+        
         # MOSTRAR INADIMPLÊNCIA GERAL (INCLUINDO VENDEDORES QUE SAÍRAM)
         logger.info(f"📊 Total de registros de inadimplência: {len(df_inadimplencia)}")
         logger.info(f"✅ Dados de inadimplência carregados (incluindo vendedores que saíram)")
         
+        # Manter apenas o resultado mais recente em memória
+        _DADOS_CACHE.clear()
+        _DADOS_CACHE[chave_dados] = df_inadimplencia
         return df_inadimplencia
         
     except Exception as e:
         logger.error(f"❌ Erro ao obter dados de inadimplência: {e}")
         return None
 
+def _codigos_chave(serie):
+    """Códigos inteiros de uma chave de agrupamento (-1 para nulos) e a quantidade de valores distintos possíveis.
+    Colunas category já trazem os códigos prontos; as demais passam por pd.factorize.
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie.cat.codes.to_numpy(), len(serie.cat.categories)
+    codigos, unicos = pd.factorize(serie, sort=False)
+    return codigos, len(unicos)
+
+def _agregar_por_vendedor(df, chave_cod, chave_nome):
+    """Soma/contagem/média por (código, nome) com np.bincount sobre ids de grupo fatorados.
+
+    Equivale ao groupby(sort=False, observed=True).agg anterior (grupos na ordem de aparição,
+    chaves nulas descartadas, NaN ignorado nas somas e médias) sem passar pelo caminho genérico do pandas.
+    """
+    cod_ids, _ = _codigos_chave(df[chave_cod])
+    nome_ids, n_nomes = _codigos_chave(df[chave_nome])
+    validos = (cod_ids >= 0) & (nome_ids >= 0)
+    # Id único por par: o multiplicador é a quantidade de nomes (nome_ids vai de 0 a n_nomes - 1)
+    par = cod_ids.astype(np.int64) * max(n_nomes, 1) + nome_ids
+    grupos, _ = pd.factorize(par[validos], sort=False)
+    linhas = np.flatnonzero(validos)
+    n_grupos = int(grupos.max()) + 1 if len(grupos) else 0
+
+    def _soma_contagem(coluna):
+        valores = pd.to_numeric(df[coluna], errors='coerce').to_numpy(dtype=np.float64)[linhas]
+        presentes = ~np.isnan(valores)
+        soma = np.bincount(grupos[presentes], weights=valores[presentes], minlength=n_grupos)
+        return soma, np.bincount(grupos[presentes], minlength=n_grupos)
+
+    soma_valor, qtd = _soma_contagem('VALOR_TITULO')
+    soma_pago, _ = _soma_contagem('VALOR_PAGO')
+    soma_dias, qtd_dias = _soma_contagem('DIAS_ATRASO')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        media_dias = soma_dias / qtd_dias
+
+    # Primeira linha de cada grupo fornece as chaves (preserva dtype/categorias das colunas)
+    _, primeiras = np.unique(grupos, return_index=True)
+    primeiras = linhas[primeiras]
+    return pd.DataFrame({
+        chave_cod: df[chave_cod].iloc[primeiras].reset_index(drop=True),
+        chave_nome: df[chave_nome].iloc[primeiras].reset_index(drop=True),
+        'VALOR_TOTAL_INADIMPLENCIA': soma_valor,
+        'QTD_TITULOS': qtd,
+        'VALOR_PAGO': soma_pago,
+        'DIAS_ATRASO_MEDIO': media_dias,
+    })
+
+# Colunas monetárias das métricas que ganham versão formatada (<coluna>_FMT) para a tabela de resumo
+METRICAS_FORMATADAS = ('VALOR_EM_ABERTO',)
+
 def calcular_metricas_inadimplencia(df_inadimplencia):
-    """Calcula métricas de inadimplência"""
+    """Calcula métricas de inadimplência (reaproveitadas enquanto os dados em cache forem os mesmos)"""
+    entrada = _METRICAS_CACHE.get('entrada')
+    if entrada is not None and entrada[0] is df_inadimplencia:
+        return entrada[1]
     try:
         # Agrupar por vendedor (usar unificação se existir)
         chave_cod = 'COD_UNIFICADO' if 'COD_UNIFICADO' in df_inadimplencia.columns else 'COD_VENDEDOR'
         chave_nome = 'NOME_UNIFICADO' if 'NOME_UNIFICADO' in df_inadimplencia.columns else 'NOME_VENDEDOR'
 
-        df_por_vendedor = df_inadimplencia.groupby([chave_cod, chave_nome]).agg({
-            'VALOR_TITULO': ['sum', 'count'],
-            'VALOR_PAGO': 'sum',
-            'DIAS_ATRASO': 'mean'
-        }).round(2)
-        
-        # Flatten das colunas
-        df_por_vendedor.columns = ['VALOR_TOTAL_INADIMPLENCIA', 'QTD_TITULOS', 'VALOR_PAGO', 'DIAS_ATRASO_MEDIO']
-        df_por_vendedor = df_por_vendedor.reset_index()
-        
+        # Precisão total; o arredondamento a 2 casas acontece só na formatação para exibição
+        df_por_vendedor = _agregar_por_vendedor(df_inadimplencia, chave_cod, chave_nome)
+
         # Calcular valor em aberto
         df_por_vendedor['VALOR_EM_ABERTO'] = df_por_vendedor['VALOR_TOTAL_INADIMPLENCIA'] - df_por_vendedor['VALOR_PAGO']
         
         # Calcular percentual de inadimplência
-        df_por_vendedor['%_INADIMPLENCIA'] = (df_por_vendedor['VALOR_EM_ABERTO'] / df_por_vendedor['VALOR_TOTAL_INADIMPLENCIA'] * 100).round(2)
+        df_por_vendedor['%_INADIMPLENCIA'] = (df_por_vendedor['VALOR_EM_ABERTO'] / df_por_vendedor['VALOR_TOTAL_INADIMPLENCIA'] * 100)
         
-        # ORDENAR DO MENOR PARA O MAIOR DIAS MÉDIO ATRASO
-        df_por_vendedor = df_por_vendedor.sort_values('DIAS_ATRASO_MEDIO', ascending=True)
+        # ORDENAR DO MENOR PARA O MAIOR DIAS MÉDIO ATRASO (no próprio frame, estável: empates mantêm a ordem do agrupamento)
+        # O detalhamento por título não é reordenado por cópia: usa as posições de _ordem_por
+        df_por_vendedor.sort_values('DIAS_ATRASO_MEDIO', ascending=True, kind='stable', inplace=True)
         
         logger.info(f"📊 Vendedores ordenados por Dias Médio Atraso (menor para maior)")
         
         # Renomear chaves para colunas padrão de exibição
-        df_por_vendedor = df_por_vendedor.rename(columns={
+        df_por_vendedor.rename(columns={
             chave_cod: 'COD_VENDEDOR',
             chave_nome: 'NOME_VENDEDOR'
-        })
+        }, inplace=True)
+        
+        # Valores já formatados para exibição (uma passada por coluna em vez de uma chamada por célula);
+        # só as colunas que o resumo realmente mostra
+        for c in METRICAS_FORMATADAS:
+            df_por_vendedor[c + '_FMT'] = formatar_valor_serie(df_por_vendedor[c])
 
+        _METRICAS_CACHE['entrada'] = (df_inadimplencia, df_por_vendedor)
         return df_por_vendedor
         
     except Exception as e:
         logger.error(f"❌ Erro ao calcular métricas: {e}")
         return None
 
+@contextmanager
+def _trava_arquivo(caminho):
+    """Trava exclusiva entre processos (flock) sobre um arquivo de trava.
+    Sem fcntl (Windows, servidor local de um único processo) não trava nada: valem as travas de thread.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(caminho, 'a') as trava:
+        fcntl.flock(trava, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(trava, fcntl.LOCK_UN)
+
+# Quantas vezes a thread atual já entrou na trava de observações (o flock de um segundo open travaria a si mesmo)
+_TRAVA_OBS_LOCAL = threading.local()
+
+@contextmanager
+def _trava_observacoes_processos():
+    """Trava exclusiva entre processos para gravar observações (o _OBS_LOCK só vale entre threads de um processo).
+    Reentrante na mesma thread: a conversão do JSON antigo pode ocorrer dentro de salvar_observacao.
+    """
+    nivel = getattr(_TRAVA_OBS_LOCAL, 'nivel', 0)
+    if nivel:
+        _TRAVA_OBS_LOCAL.nivel = nivel + 1
+        try:
+            yield
+        finally:
+            _TRAVA_OBS_LOCAL.nivel = nivel
+        return
+    with _trava_arquivo(OBSERVACOES_LOCK_FILE):
+        _TRAVA_OBS_LOCAL.nivel = 1
+        try:
+            yield
+        finally:
+            _TRAVA_OBS_LOCAL.nivel = 0
+
+def _proximo_id_observacao(observacoes):
+    """Id seguinte ao da última observação gravada (a lista deve ter sido relida com a trava entre processos)."""
+    if observacoes:
+        ultimo = observacoes[-1].get('id') if isinstance(observacoes[-1], dict) else None
+        if isinstance(ultimo, int):
+            return max(ultimo, len(observacoes)) + 1
+    return len(observacoes) + 1
+
+def _ler_arquivo_observacoes(caminho):
+    """Lê um arquivo de observações: JSONL (uma por linha) ou, no formato antigo, uma lista JSON.
+    Linhas inválidas (ex.: última linha truncada por uma gravação interrompida) são ignoradas.
+    Lido em bytes: o orjson decodifica o UTF-8 direto, sem passar cada linha por str antes.
+    """
+    with open(caminho, 'rb') as f:
+        if not caminho.endswith('.jsonl'):
+            return json_loads(f.read())
+        data = []
+        for num, linha in enumerate(f, 1):
+            if not linha.strip():
+                continue
+            try:
+                data.append(json_loads(linha))
+            except ValueError:
+                logger.warning(f"⚠️ {caminho}: linha {num} inválida ignorada")
+        return data
+
+def _ler_observacoes_json():
+    """Lê o JSONL local de observações, reaproveitando a lista em memória enquanto o arquivo não mudar.
+    Se só existir o JSON antigo, ele é convertido para JSONL uma vez.
+    Deve ser chamada com _OBS_LOCK adquirido. Retorna None se não houver arquivo ou não for uma lista.
+    """
+    if not os.path.exists(OBSERVACOES_FILE):
+        if not os.path.exists(OBSERVACOES_FILE_LEGADO):
+            return None
+        # Conversão com a trava entre processos; outro worker pode ter convertido (e já anexado) enquanto esperávamos
+        with _trava_observacoes_processos():
+            if not os.path.exists(OBSERVACOES_FILE):
+                data = _ler_arquivo_observacoes(OBSERVACOES_FILE_LEGADO)
+                if not isinstance(data, list):
+                    return None
+                _gravar_observacoes_json(data)
+                logger.info(f"📄 carregar_observacoes: {OBSERVACOES_FILE_LEGADO} convertido para {OBSERVACOES_FILE} ({len(data)} registro(s))")
+                return data
+    assinatura = assinatura_arquivo(OBSERVACOES_FILE)
+    if _OBS_CACHE['data'] is not None and _OBS_CACHE['assinatura'] == assinatura:
+        return _OBS_CACHE['data']
+    data = _ler_arquivo_observacoes(OBSERVACOES_FILE)
+    logger.info(f"📄 carregar_observacoes (JSONL): {len(data)} registro(s)")
+    _OBS_CACHE['assinatura'] = assinatura
+    _OBS_CACHE['data'] = data
+    return data
+
+def _gravar_observacoes_json(lista):
+    """Regrava o JSONL inteiro de forma atômica (arquivo temporário + os.replace) e atualiza o cache.
+    Usada só para restaurar/converter; novas observações vão por _anexar_observacao_json.
+    Deve ser chamada com _OBS_LOCK e _trava_observacoes_processos() adquiridos.
+    """
+    # Temporário exclusivo deste processo/thread: dois workers nunca escrevem no mesmo arquivo
+    tmp = _caminho_temporario(OBSERVACOES_FILE)
+    with open(tmp, 'wb') as f:
+        f.writelines(json_bytes(o) + b'\n' for o in lista)
+    os.replace(tmp, OBSERVACOES_FILE)
+    _OBS_CACHE['assinatura'] = assinatura_arquivo(OBSERVACOES_FILE)
+    _OBS_CACHE['data'] = lista
+
+def _anexar_observacao_json(lista, observacao):
+    """Acrescenta uma linha ao JSONL (O(1), sem reler nem regravar o arquivo) e atualiza o cache para lista.
+    Deve ser chamada com _OBS_LOCK adquirido; lista já deve conter a observação.
+    """
+    linha = json_bytes(observacao) + b'\n'
+    with open(OBSERVACOES_FILE, 'ab+') as f:
+        # Última linha sem '\n' (gravação interrompida): começa numa linha nova para não colar no lixo
+        if f.seek(0, os.SEEK_END) > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                linha = b'\n' + linha
+        f.write(linha)
+    _OBS_CACHE['assinatura'] = assinatura_arquivo(OBSERVACOES_FILE)
+    _OBS_CACHE['data'] = lista
+
+def observacoes_do_cliente(observacoes, codigo):
+    """Observações de um cliente via índice por código (refeito só quando a lista carregada muda)."""
+    with _OBS_LOCK:
+        if _OBS_POR_CLIENTE['lista'] is not observacoes:
+            indice = {}
+            for o in observacoes:
+                indice.setdefault(str(o.get('codigo_vendedor', '')), []).append(o)
+            _OBS_POR_CLIENTE['lista'] = observacoes
+            _OBS_POR_CLIENTE['indice'] = indice
+        return _OBS_POR_CLIENTE['indice'].get(str(codigo), [])
+
 def carregar_observacoes():
     """Carrega observações priorizando JSON local (site), depois Gist e por fim DB."""
     # 1) JSON local (prioridade para exibir no site de imediato)
     try:
-        if os.path.exists(OBSERVACOES_FILE):
-            with open(OBSERVACOES_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                logger.info(f"📄 carregar_observacoes (JSON): {len(data)} registro(s)")
-                if isinstance(data, list) and len(data) >= 0:
-                    return data
+        with _OBS_LOCK:
+            data = _ler_observacoes_json()
+        if data is not None:
+            return data
     except Exception as e:
         logger.error(f"❌ carregar_observacoes (JSON): erro: {e}")
     # 2) Gist
     try:
         if GIST_TOKEN and GIST_ID:
             logger.info("☁️ carregar_observacoes: tentando Gist...")
-            headers = {"Authorization": f"token {GIST_TOKEN}", "Accept": "application/vnd.github+json"}
-            r = requests.get(f"https://api.github.com/gists/{GIST_ID}", headers=headers, timeout=15)
+            headers = {"Authorization": f"token {GIST_TOKEN}"}
+            r = _HTTP.get(f"https://api.github.com/gists/{GIST_ID}", headers=headers, timeout=15)
             if r.status_code == 200:
-                data = r.json()
+                data = json_loads(r.content)
                 files = data.get('files', {})
                 if GIST_FILENAME in files and files[GIST_FILENAME].get('content') is not None:
                     content = files[GIST_FILENAME]['content']
-                    lista = json.loads(content) if content.strip() else []
+                    lista = json_loads(content) if content.strip() else []
                     logger.info(f"✅ carregar_observacoes (Gist): {len(lista)} registro(s)")
+                    # Restaura o JSON local: as próximas leituras usam o cache em memória, sem nova chamada ao GitHub
+                    if isinstance(lista, list):
+                        try:
+                            with _OBS_LOCK, _trava_observacoes_processos():
+                                if not os.path.exists(OBSERVACOES_FILE):
+                                    _gravar_observacoes_json(lista)
+                                    logger.info("📄 carregar_observacoes: JSON local restaurado a partir do Gist")
+                        except Exception as e:
+                            logger.warning(f"⚠️ carregar_observacoes: não foi possível restaurar o JSON local: {e}")
                     return lista
             else:
                 logger.warning(f"⚠️ carregar_observacoes (Gist): status {r.status_code}")
@@ -407,113 +1060,143 @@ def carregar_observacoes():
     try:
         if os.environ.get('DATABASE_URL'):
             logger.info("🔌 carregar_observacoes: tentando DB...")
-        conn = get_db_connection()
-        if conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
-                    CREATE TABLE IF NOT EXISTS observacoes (
-                        id SERIAL PRIMARY KEY,
-                        nome_vendedor TEXT NOT NULL,
-                        codigo_vendedor TEXT NOT NULL,
-                        observacao TEXT NOT NULL,
-                        data_observacao DATE NOT NULL,
-                        data_envio TIMESTAMP NOT NULL DEFAULT NOW()
-                    )
-                """)
-                conn.commit()
-                cur.execute("SELECT id, nome_vendedor, codigo_vendedor, observacao, data_observacao, data_envio FROM observacoes ORDER BY id ASC")
-                rows = cur.fetchall()
-                conn.close()
+        with conexao_db() as conn:
+            if conn:
+                garantir_tabela_observacoes(conn)
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    cur.execute("SELECT id, nome_vendedor, codigo_vendedor, observacao, data_observacao, data_envio FROM observacoes ORDER BY id ASC")
+                    rows = cur.fetchall()
                 logger.info(f"✅ carregar_observacoes: {len(rows)} registro(s) do DB")
                 return list(rows)
     except Exception as e:
         logger.warning(f"⚠️ carregar_observacoes: DB indisponível: {e}")
-    # Fallback JSON
+    # Fallback JSONL
     try:
         if os.path.exists(OBSERVACOES_FILE):
-            with open(OBSERVACOES_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                logger.info(f"📄 carregar_observacoes (JSON): {len(data)} registro(s)")
-                return data
+            data = _ler_arquivo_observacoes(OBSERVACOES_FILE)
+            logger.info(f"📄 carregar_observacoes (JSONL): {len(data)} registro(s)")
+            return data
     except Exception as e:
         logger.error(f"❌ carregar_observacoes (JSON): erro: {e}")
     return []
 
+# Replicação assíncrona no Gist: a requisição HTTP do usuário não espera o GitHub
+_gist_queue = queue.Queue()
+_gist_worker = {'thread': None, 'pid': None}
+
+def _gist_worker_loop():
+    """Consome a fila e envia o JSON completo ao Gist (reaproveitando a conexão TLS).
+    Cada item é só um aviso de mudança: a lista enviada é relida do JSONL na hora do envio, com a trava do Gist
+    entre processos. Assim os envios de todos os workers saem em ordem e o último sempre leva o estado mais novo
+    (um worker nunca regrava no Gist uma lista mais antiga que a de outro).
+    """
+    while True:
+        _gist_queue.get()
+        # Vários avisos acumulados valem por um envio
+        try:
+            while True:
+                _gist_queue.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            with _trava_arquivo(GIST_LOCK_FILE):
+                with _OBS_LOCK, _trava_observacoes_processos():
+                    atuais = _ler_observacoes_json()
+                if atuais is None:
+                    continue
+                _enviar_gist(atuais)
+        except Exception as e:
+            logger.warning(f"⚠️ Gist (segundo plano): erro: {e}")
+
+def _enviar_gist(atuais):
+    """PATCH da lista completa no arquivo do Gist."""
+    payload = {
+        "files": {
+            GIST_FILENAME: {
+                "content": json_bytes(atuais, indent=True).decode('utf-8')
+            }
+        }
+    }
+    headers = {"Authorization": f"token {GIST_TOKEN}", "Content-Type": "application/json"}
+    r = _HTTP.patch(f"https://api.github.com/gists/{GIST_ID}", headers=headers, data=json_bytes(payload), timeout=20)
+    if r.status_code in (200, 201):
+        logger.info(f"✅ Gist sincronizado em segundo plano: {len(atuais)} registro(s)")
+    else:
+        logger.warning(f"⚠️ Gist (segundo plano): status {r.status_code} body={r.text[:200]}")
+
+def enfileirar_sync_gist():
+    """Agenda a replicação do JSONL no Gist, iniciando a thread de envio se necessário.
+    A thread é criada sob demanda (e recriada após fork do gunicorn), pois threads não sobrevivem ao fork.
+    """
+    with _OBS_LOCK:
+        t = _gist_worker['thread']
+        if t is None or not t.is_alive() or _gist_worker['pid'] != os.getpid():
+            t = threading.Thread(target=_gist_worker_loop, name='gist-sync', daemon=True)
+            t.start()
+            _gist_worker['thread'] = t
+            _gist_worker['pid'] = os.getpid()
+    _gist_queue.put_nowait(True)
+
 def salvar_observacao(observacao):
     """Salva a observação no JSON (site) e tenta replicar no Gist; mantém DB como extra."""
     sucesso_json = False
     # 1) Salvar JSON local SEMPRE para refletir no site
     try:
-        atuais = []
-        if os.path.exists(OBSERVACOES_FILE):
-            with open(OBSERVACOES_FILE, 'r', encoding='utf-8') as f:
-                try:
-                    atuais = json.load(f)
-                except Exception:
-                    atuais = []
-        observacao['id'] = (len(atuais) + 1) if isinstance(atuais, list) else 1
-        observacao['data_envio'] = datetime.now().isoformat()
-        if not isinstance(atuais, list):
-            atuais = []
-        atuais.append(observacao)
-        with open(OBSERVACOES_FILE, 'w', encoding='utf-8') as f:
-            json.dump(atuais, f, ensure_ascii=False, indent=2)
+        # Trava entre threads e entre workers: a releitura, o id e o append acontecem sem outro gravador no meio
+        with _OBS_LOCK, _trava_observacoes_processos():
+            # Partir da lista em memória (o arquivo só é relido se mudou por fora, ex.: append de outro worker)
+            try:
+                base = _ler_observacoes_json() or []
+            except Exception:
+                base = []
+            # Nova lista (cópia rasa) para não alterar a que leitores concorrentes estão percorrendo
+            atuais = list(base)
+            observacao['id'] = _proximo_id_observacao(atuais)
+            agora = datetime.now()
+            observacao['data_envio'] = agora.isoformat()
+            # Texto de exibição gravado junto: o modal mostra direto, sem reinterpretar a data a cada abertura
+            observacao['data_envio_fmt'] = agora.strftime('%d/%m/%Y às %H:%M')
+            atuais.append(observacao)
+            _anexar_observacao_json(atuais, observacao)
+            # Índice por cliente atualizado de forma incremental (novo dict; as listas antigas não são alteradas)
+            if _OBS_POR_CLIENTE['lista'] is base:
+                indice = dict(_OBS_POR_CLIENTE['indice'])
+                cod = str(observacao.get('codigo_vendedor', ''))
+                indice[cod] = indice.get(cod, []) + [observacao]
+                _OBS_POR_CLIENTE['lista'] = atuais
+                _OBS_POR_CLIENTE['indice'] = indice
         logger.info(f"✅ salvar_observacao: salva em JSON para vendedor='{observacao['nome_vendedor']}', codigo='{observacao['codigo_vendedor']}'")
         sucesso_json = True
     except Exception as e:
         logger.error(f"❌ salvar_observacao (JSON): erro: {e}")
-    # 2) Tentar Gist (replicação)
+    # 2) Tentar Gist (replicação em segundo plano, consistência eventual)
     try:
-        if GIST_TOKEN and GIST_ID:
-            logger.info("📝 salvar_observacao: tentando Gist...")
-            payload = {
-                "files": {
-                    GIST_FILENAME: {
-                        "content": json.dumps(atuais, ensure_ascii=False, indent=2)
-                    }
-                }
-            }
-            headers = {"Authorization": f"token {GIST_TOKEN}", "Accept": "application/vnd.github+json"}
-            r = requests.patch(f"https://api.github.com/gists/{GIST_ID}", headers=headers, json=payload, timeout=20)
-            if r.status_code in (200, 201):
-                logger.info(f"✅ salvar_observacao: salva no Gist para vendedor='{observacao['nome_vendedor']}', codigo='{observacao['codigo_vendedor']}'")
-            else:
-                logger.warning(f"⚠️ salvar_observacao (Gist): status {r.status_code} body={r.text[:200]}")
+        if GIST_TOKEN and GIST_ID and sucesso_json:
+            enfileirar_sync_gist()
+            logger.info(f"📝 salvar_observacao: replicação no Gist agendada para vendedor='{observacao['nome_vendedor']}', codigo='{observacao['codigo_vendedor']}'")
     except Exception as e:
         logger.warning(f"⚠️ salvar_observacao (Gist): erro: {e}")
     # 3) DB (opcional)
     try:
         if os.environ.get('DATABASE_URL'):
             logger.info("📝 salvar_observacao: tentando DB...")
-        conn = get_db_connection()
-        if conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    CREATE TABLE IF NOT EXISTS observacoes (
-                        id SERIAL PRIMARY KEY,
-                        nome_vendedor TEXT NOT NULL,
-                        codigo_vendedor TEXT NOT NULL,
-                        observacao TEXT NOT NULL,
-                        data_observacao DATE NOT NULL,
-                        data_envio TIMESTAMP NOT NULL DEFAULT NOW()
-                    )
-                    """
-                )
-                cur.execute(
-                    """
-                    INSERT INTO observacoes (nome_vendedor, codigo_vendedor, observacao, data_observacao)
-                    VALUES (%s, %s, %s, %s)
-                    """,
-                    (
-                        observacao['nome_vendedor'],
-                        str(observacao['codigo_vendedor']),
-                        observacao['observacao'],
-                        observacao['data_observacao']
+        with conexao_db() as conn:
+            if conn:
+                garantir_tabela_observacoes(conn)
+                with conn.cursor() as cur:
+                    cur.execute(
+                        """
+                        INSERT INTO observacoes (nome_vendedor, codigo_vendedor, observacao, data_observacao)
+                        VALUES (%s, %s, %s, %s)
+                        """,
+                        (
+                            observacao['nome_vendedor'],
+                            str(observacao['codigo_vendedor']),
+                            observacao['observacao'],
+                            observacao['data_observacao']
+                        )
                     )
-                )
                 conn.commit()
-                conn.close()
                 logger.info(f"✅ salvar_observacao: salva no DB para vendedor='{observacao['nome_vendedor']}', codigo='{observacao['codigo_vendedor']}'")
                 return True
     except Exception as e:
@@ -521,96 +1204,157 @@ def salvar_observacao(observacao):
     return sucesso_json
 
 def get_db_connection():
-    """Abre conexão com Postgres via DATABASE_URL (Neon)."""
+    """Obtém uma conexão do pool Postgres via DATABASE_URL (Neon).
+    O pool é criado na primeira chamada; devolva a conexão com put_db_connection().
+    """
+    global _DB_POOL
     try:
         db_url = os.environ.get('DATABASE_URL')
         if not db_url:
             return None
-        logger.info("🔗 Conectando ao Postgres...")
-        conn = psycopg2.connect(db_url)
-        logger.info("✅ Conexão Postgres OK")
-        return conn
+        if _DB_POOL is None:
+            with _DB_POOL_LOCK:
+                if _DB_POOL is None:
+                    logger.info("🔗 Criando pool de conexões Postgres...")
+                    _DB_POOL = ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, dsn=db_url)
+                    logger.info(f"✅ Pool Postgres OK (min={DB_POOL_MIN}, max={DB_POOL_MAX})")
+        return _DB_POOL.getconn()
     except Exception as e:
         logger.warning(f"⚠️ Falha ao conectar ao Postgres: {e}")
         return None
 
+def put_db_connection(conn, close=False):
+    """Devolve a conexão ao pool (close=True descarta uma conexão quebrada)."""
+    try:
+        if _DB_POOL is not None:
+            _DB_POOL.putconn(conn, close=close)
+        else:
+            conn.close()
+    except Exception as e:
+        logger.warning(f"⚠️ Falha ao devolver conexão ao pool: {e}")
+
+@contextmanager
+def conexao_db():
+    """Empresta uma conexão do pool (None se não houver DB) e a devolve ao sair.
+    Conexões que falharam no nível de rede/protocolo são descartadas em vez de voltar ao pool.
+    """
+    conn = get_db_connection()
+    quebrada = False
+    try:
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        quebrada = True
+        raise
+    finally:
+        if conn is not None:
+            put_db_connection(conn, close=quebrada)
+
+def garantir_tabela_observacoes(conn):
+    """Cria a tabela de observações se necessário, uma única vez por processo.
+    Depois da primeira execução as leituras/gravações vão direto ao SELECT/INSERT, sem DDL.
+    """
+    global _TABELA_OBSERVACOES_OK
+    if _TABELA_OBSERVACOES_OK:
+        return
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS observacoes (
+                id SERIAL PRIMARY KEY,
+                nome_vendedor TEXT NOT NULL,
+                codigo_vendedor TEXT NOT NULL,
+                observacao TEXT NOT NULL,
+                data_observacao DATE NOT NULL,
+                data_envio TIMESTAMP NOT NULL DEFAULT NOW()
+            )
+            """
+        )
+        # Consultas por cliente (modal de observações) vão pelo índice em vez de varrer a tabela
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_observacoes_codigo_vendedor ON observacoes (codigo_vendedor)")
+    conn.commit()
+    _TABELA_OBSERVACOES_OK = True
+
+def observacoes_do_cliente_db(codigo):
+    """Observações de um cliente direto do DB (WHERE pelo índice de codigo_vendedor).
+    Retorna None se o DB não estiver configurado ou disponível.
+    """
+    try:
+        with conexao_db() as conn:
+            if not conn:
+                return None
+            garantir_tabela_observacoes(conn)
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(
+                    "SELECT id, nome_vendedor, codigo_vendedor, observacao, data_observacao, data_envio "
+                    "FROM observacoes WHERE codigo_vendedor = %s ORDER BY id ASC",
+                    (str(codigo),)
+                )
+                return list(cur.fetchall())
+    except Exception as e:
+        logger.warning(f"⚠️ observacoes_do_cliente_db: DB indisponível: {e}")
+        return None
+
 def migrate_json_to_db_if_needed():
     """Migra automaticamente o JSON de observações para Postgres, uma única vez.
     Regra: se a tabela existir e tiver registros, não migra. Se vazia e JSON existir, insere todos.
     """
     try:
         logger.info("🚚 Iniciando migração JSON->DB (se necessário)...")
-        conn = get_db_connection()
-        if not conn:
-            logger.info("ℹ️ Migração: sem conexão DB; pulando")
-            return
-        with conn.cursor() as cur:
-            # Garantir tabela
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS observacoes (
-                    id SERIAL PRIMARY KEY,
-                    nome_vendedor TEXT NOT NULL,
-                    codigo_vendedor TEXT NOT NULL,
-                    observacao TEXT NOT NULL,
-                    data_observacao DATE NOT NULL,
-                    data_envio TIMESTAMP NOT NULL DEFAULT NOW()
-                )
-                """
-            )
-            conn.commit()
-            # Verificar se já possui dados
-            cur.execute("SELECT COUNT(1) FROM observacoes")
-            qtd = cur.fetchone()[0]
-            if qtd and int(qtd) > 0:
-                conn.close()
-                logger.info(f"ℹ️ Migração: tabela já possui {qtd} registro(s); nada a fazer")
-                return
-            # Carregar JSON se existir
-            if not os.path.exists(OBSERVACOES_FILE):
-                conn.close()
-                logger.info("ℹ️ Migração: JSON inexistente; nada a migrar")
+        with conexao_db() as conn:
+            if not conn:
+                logger.info("ℹ️ Migração: sem conexão DB; pulando")
                 return
-            with open(OBSERVACOES_FILE, 'r', encoding='utf-8') as f:
-                dados = json.load(f)
-            if not isinstance(dados, list) or len(dados) == 0:
-                conn.close()
-                logger.info("ℹ️ Migração: JSON vazio; nada a migrar")
-                return
-            # Inserir em batch
-            inseridos = 0
-            for obs in dados:
-                try:
-                    nome = str(obs.get('nome_vendedor', '')).strip()
-                    cod = str(obs.get('codigo_vendedor', '')).strip()
-                    texto = str(obs.get('observacao', '')).strip()
-                    data_obs = obs.get('data_observacao') or ''
-                    if not data_obs:
-                        # Extrair só a data de data_envio, se existir
-                        de = str(obs.get('data_envio', '')).strip()
-                        data_obs = de.split('T')[0][:10] if de else datetime.now().strftime('%Y-%m-%d')
-                    if not nome or not cod or not texto:
+            # Garantir tabela (DDL executado uma vez por processo)
+            garantir_tabela_observacoes(conn)
+            with conn.cursor() as cur:
+                # Verificar se já possui dados
+                cur.execute("SELECT COUNT(1) FROM observacoes")
+                qtd = cur.fetchone()[0]
+                if qtd and int(qtd) > 0:
+                    logger.info(f"ℹ️ Migração: tabela já possui {qtd} registro(s); nada a fazer")
+                    return
+                # Carregar JSONL (ou o JSON antigo) se existir
+                caminho = next((c for c in (OBSERVACOES_FILE, OBSERVACOES_FILE_LEGADO) if os.path.exists(c)), None)
+                if not caminho:
+                    logger.info("ℹ️ Migração: JSON inexistente; nada a migrar")
+                    return
+                dados = _ler_arquivo_observacoes(caminho)
+                if not isinstance(dados, list) or len(dados) == 0:
+                    logger.info("ℹ️ Migração: JSON vazio; nada a migrar")
+                    return
+                # Validar e inserir em batch (um único INSERT ... VALUES paginado)
+                linhas = []
+                for obs in dados:
+                    try:
+                        nome = str(obs.get('nome_vendedor', '')).strip()
+                        cod = str(obs.get('codigo_vendedor', '')).strip()
+                        texto = str(obs.get('observacao', '')).strip()
+                        data_obs = obs.get('data_observacao') or ''
+                        if not data_obs:
+                            # Extrair só a data de data_envio, se existir
+                            de = str(obs.get('data_envio', '')).strip()
+                            data_obs = de.split('T')[0][:10] if de else datetime.now().strftime('%Y-%m-%d')
+                        if not nome or not cod or not texto:
+                            continue
+                        linhas.append((nome, cod, texto, data_obs))
+                    except Exception:
                         continue
-                    cur.execute(
-                        """
-                        INSERT INTO observacoes (nome_vendedor, codigo_vendedor, observacao, data_observacao)
-                        VALUES (%s, %s, %s, %s)
-                        """,
-                        (nome, cod, texto, data_obs)
+                if linhas:
+                    execute_values(
+                        cur,
+                        "INSERT INTO observacoes (nome_vendedor, codigo_vendedor, observacao, data_observacao) VALUES %s",
+                        linhas,
+                        page_size=500
                     )
-                    inseridos += 1
-                except Exception:
-                    continue
-            conn.commit()
-            conn.close()
-            if inseridos > 0:
-                logger.info(f"✅ Migração JSON->DB concluída: {inseridos} observação(ões) migradas")
+                inseridos = len(linhas)
+                conn.commit()
+                if inseridos > 0:
+                    logger.info(f"✅ Migração JSON->DB concluída: {inseridos} observação(ões) migradas")
     except Exception as e:
         logger.warning(f"⚠️ Falha na migração automática JSON->DB: {e}")
 
-def gerar_pagina_upload():
-    """Gera página de upload quando não há dados"""
-    html_content = """
+# Página de upload (estática): codificada uma vez no import; cada GET devolve o mesmo buffer de bytes
+_UPLOAD_PAGE_HTML = """
     <!DOCTYPE html>
     <html lang="pt-BR">
     <head>
@@ -817,419 +1561,347 @@ def gerar_pagina_upload():
         </script>
     </body>
     </html>
-    """
-    return html_content
+    """.encode('utf-8')
+
+# Versão gzip da página de upload, comprimida uma única vez (nível máximo: o custo é pago só no import)
+_UPLOAD_PAGE_GZ = zlib.compress(_UPLOAD_PAGE_HTML, 9, wbits=31)
+
+def gerar_pagina_upload():
+    """Gera página de upload quando não há dados (já comprimida se o cliente aceitar gzip)"""
+    if request.accept_encodings['gzip']:
+        resp = Response(_UPLOAD_PAGE_GZ, mimetype='text/html')
+        resp.headers['Content-Encoding'] = 'gzip'
+    else:
+        resp = Response(_UPLOAD_PAGE_HTML, mimetype='text/html')
+    resp.headers['Vary'] = 'Accept-Encoding'
+    return resp
+
+# Página exibida enquanto o upload recém-enviado é processado (recarrega sozinha a cada 2 s)
+_PROCESSANDO_PAGE_HTML = """
+    <!DOCTYPE html>
+    <html lang="pt-BR">
+    <head>
+        <meta charset="UTF-8">
+        <meta http-equiv="refresh" content="2">
+        <title>Processando planilha - Relatório de Inadimplência</title>
+        <style>
+            body {
+                font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+                background-color: #f5f5f5;
+                color: #333;
+                text-align: center;
+                padding-top: 80px;
+            }
+        </style>
+    </head>
+    <body>
+        <h2>⏳ Processando a planilha enviada...</h2>
+        <p>O relatório abre automaticamente assim que o processamento terminar.</p>
+    </body>
+    </html>
+    """.encode('utf-8')
+
+def gerar_pagina_processando():
+    """Página de espera enquanto o upload é processado em segundo plano"""
+    return Response(_PROCESSANDO_PAGE_HTML, mimetype='text/html')
 
-def gerar_html_relatorio(df_inadimplencia, df_metricas, observacoes):
-    """Gera HTML do relatório"""
+# Processamento do upload em segundo plano (uma thread por upload, por processo)
+_upload_worker = {'thread': None, 'pid': None}
+# Marcador em uploads/ (um arquivo por processo) para os outros workers do gunicorn também mostrarem a página de espera
+UPLOAD_MARCADOR_PREFIXO = '.processando.'
+# Marcador mais antigo que isto é tratado como abandonado (worker encerrado no meio do processamento)
+UPLOAD_MARCADOR_MAX_SEGUNDOS = 600
+
+def _caminho_marcador_upload(pid):
+    return os.path.join(UPLOAD_FOLDER, f"{UPLOAD_MARCADOR_PREFIXO}{pid}")
+
+def _processo_ativo(pid):
+    """Se o processo existe nesta máquina (os workers do gunicorn compartilham o mesmo host)."""
+    if os.name == 'nt':
+        return True  # no Windows os.kill encerraria o processo; vale só o limite de idade do marcador
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # existe, mas pertence a outro usuário
+    return True
+
+def _preprocessar_upload(filepath, anterior=None):
+    """Converte o upload para Parquet e já calcula dados e métricas, deixando os caches prontos para o relatório."""
+    if anterior is not None:
+        anterior.join()  # uploads seguidos são processados em ordem
     try:
-        hoje = datetime.now()
-        dia_atual_menos_1 = hoje - timedelta(days=1)
-        data_fim = dia_atual_menos_1
+        carregar_planilhas(filepath)
+        df_inadimplencia = obter_dados_inadimplencia()
+        if df_inadimplencia is not None:
+            calcular_metricas_inadimplencia(df_inadimplencia)
+        logger.info(f"✅ Upload processado em segundo plano: {filepath}")
+    except Exception as e:
+        logger.warning(f"⚠️ Processamento do upload adiado para a primeira leitura: {e}")
+    finally:
+        # Só o último upload deste processo retira o marcador (um upload seguinte ainda pode estar na fila)
+        if _upload_worker['thread'] is threading.current_thread():
+            try:
+                os.remove(_caminho_marcador_upload(os.getpid()))
+            except OSError:
+                pass
+
+def iniciar_preprocessamento_upload(filepath):
+    """Dispara o processamento do upload sem segurar a resposta HTTP."""
+    anterior = _upload_worker['thread'] if _upload_worker['pid'] == os.getpid() else None
+    t = threading.Thread(target=_preprocessar_upload, args=(filepath, anterior), name='upload-preprocess', daemon=True)
+    _upload_worker['thread'] = t
+    _upload_worker['pid'] = os.getpid()
+    try:
+        with open(_caminho_marcador_upload(os.getpid()), 'w') as f:
+            f.write(filepath)
+    except OSError as e:
+        logger.warning(f"⚠️ Não foi possível criar o marcador de upload em processamento: {e}")
+    t.start()
+
+def upload_em_processamento():
+    """True enquanto um upload ainda está sendo processado, neste processo ou em outro worker (marcador em uploads/).
+    Marcadores de outros processos que não existem mais, ou antigos demais, são removidos.
+    """
+    t = _upload_worker['thread']
+    if t is not None and _upload_worker['pid'] == os.getpid() and t.is_alive():
+        return True
+    try:
+        entradas = list(os.scandir(UPLOAD_FOLDER))
+    except OSError:
+        return False
+    agora = time.time()
+    for entrada in entradas:
+        if not entrada.name.startswith(UPLOAD_MARCADOR_PREFIXO):
+            continue
         try:
-            data_inicio = data_fim.replace(year=data_fim.year - 1)
-        except ValueError:
-            data_inicio = (data_fim - timedelta(days=1)).replace(year=(data_fim - timedelta(days=1)).year - 1)
-        
-        # Calcular totais
-        total_valor_inadimplencia = df_inadimplencia['VALOR_TITULO'].sum()
-        total_titulos = len(df_inadimplencia)
-        total_valor_pago = df_inadimplencia['VALOR_PAGO'].sum()
-        total_em_aberto = total_valor_inadimplencia - total_valor_pago
-        
-        # Gerar opções de vendedores para o filtro com unificação
-        base_nomes = 'NOME_UNIFICADO' if 'NOME_UNIFICADO' in df_inadimplencia.columns else 'NOME_VENDEDOR'
-        vendedores_unicos = df_inadimplencia[[base_nomes]].drop_duplicates()
-        opcoes_vendedores = ""
-        for _, row in vendedores_unicos.iterrows():
-            nome_v = str(row[base_nomes]) if row[base_nomes] is not None else ""
-            opcoes_vendedores += f'<option value="{nome_v}">{nome_v}</option>'
-        
-        # Mapa de quantidade de observações por cliente (para indicador na tabela)
-        obs_por_cliente = {}
+            pid = int(entrada.name[len(UPLOAD_MARCADOR_PREFIXO):])
+            recente = agora - entrada.stat().st_mtime < UPLOAD_MARCADOR_MAX_SEGUNDOS
+        except (ValueError, OSError):
+            continue
+        # O marcador deste processo é retirado pela própria thread (o estado local já foi verificado acima)
+        if pid == os.getpid():
+            continue
+        if recente and _processo_ativo(pid):
+            return True
         try:
-            for o in (observacoes or []):
-                cod = str(o.get('codigo_vendedor', '')).strip()
-                if not cod:
-                    continue
-                obs_por_cliente[cod] = obs_por_cliente.get(cod, 0) + 1
-        except Exception:
-            obs_por_cliente = {}
-        
-        # Gerar HTML
-        html_content = f"""
+            os.remove(entrada.path)
+            logger.info(f"ℹ️ Marcador de upload abandonado removido: {entrada.name}")
+        except OSError:
+            pass
+    return False
+
+def _ordem_por(*colunas):
+    """Posições que ordenam as colunas (ascendente, estável, vazios por último), como sort_values faria."""
+    chaves = []
+    for coluna in reversed(colunas):
+        codigos, unicos = pd.factorize(coluna, sort=True)
+        chaves.append(np.where(codigos < 0, len(unicos), codigos))
+    return np.lexsort(chaves)
+
+def escapar_html(valor):
+    """Texto seguro para HTML (conteúdo e atributos)."""
+    return str(valor).translate(_HTML_ESCAPE)
+
+def _coluna_texto(serie, escapar=False):
+    """Converte uma coluna em array de objetos str (mesmo texto de str(valor)), pronto para concatenação vetorizada.
+    Com escapar=True o texto sai com o HTML escapado.
+    """
+    textos = serie.to_numpy(dtype=object).astype(str).astype(object)
+    return _escapar_textos(textos) if escapar else textos
+
+def _por_valores_unicos(valores, funcao):
+    """Aplica `funcao` (que recebe e devolve uma coluna) só aos valores distintos e espalha o resultado
+    pelas linhas. Códigos de cliente, nomes, datas e dias se repetem muito: o trabalho por texto cai
+    de N linhas para a quantidade de valores distintos.
+    """
+    codigos, unicos = pd.factorize(valores, use_na_sentinel=False)
+    return np.asarray(funcao(pd.Series(unicos)), dtype=object)[codigos]
+
+def _escapar_textos(textos):
+    """Escapa HTML de um array de textos inteiro (str.translate vetorizado)."""
+    return pd.Series(textos, dtype=object).str.translate(_HTML_ESCAPE).to_numpy(dtype=object)
+
+def _coluna_nome_vendedor(df_inadimplencia):
+    """Coluna de nome do vendedor exibida (unificado, se existir)."""
+    return 'NOME_UNIFICADO' if 'NOME_UNIFICADO' in df_inadimplencia.columns else 'NOME_VENDEDOR'
+
+def _contar_obs_por_cliente(observacoes):
+    """Quantidade de observações por código de cliente (indicador na tabela).
+    A contagem é feita uma vez por lista carregada e reaproveitada pelo relatório e pelas páginas da API.
+    """
+    with _OBS_LOCK:
+        if observacoes is not None and _OBS_CONTAGEM['lista'] is observacoes:
+            return _OBS_CONTAGEM['contagem']
+    try:
+        contagem = Counter(
+            cod for cod in (str(o.get('codigo_vendedor', '')).strip() for o in (observacoes or [])) if cod
+        )
+    except Exception:
+        return Counter()
+    with _OBS_LOCK:
+        _OBS_CONTAGEM['lista'] = observacoes
+        _OBS_CONTAGEM['contagem'] = contagem
+    return contagem
+
+def _ordem_detalhamento(df_inadimplencia, base_nomes):
+    """Posições do detalhamento ordenado por vendedor e cliente (ordem alfabética).
+    Calculadas uma vez para os dados em cache: cada página da API só filtra e fatia.
+    """
+    entrada = _ORDEM_DETALHE_CACHE.get('entrada')
+    if entrada is not None and entrada[0] is df_inadimplencia and entrada[1] == base_nomes:
+        return entrada[2]
+    try:
+        ordem = _ordem_por(df_inadimplencia[base_nomes], df_inadimplencia['NOME_CLIENTE'])
+    except Exception:
+        ordem = _ordem_por(df_inadimplencia[base_nomes])
+    ordem.flags.writeable = False  # compartilhada entre requisições
+    _ORDEM_DETALHE_CACHE['entrada'] = (df_inadimplencia, base_nomes, ordem)
+    return ordem
+
+def _colunas_filtro_detalhamento(df_inadimplencia, base_nomes):
+    """Colunas comparadas pelos filtros do detalhamento (nome base do vendedor, status do título, valor),
+    calculadas uma vez para os dados em cache: cada página da API só compara arrays.
+    """
+    entrada = _FILTRO_DETALHE_CACHE.get('entrada')
+    if entrada is not None and entrada[0] is df_inadimplencia and entrada[1] == base_nomes:
+        return entrada[2]
+    # Parte do nome exibido após " - " (nome base do vendedor)
+    nome_base = _por_valores_unicos(
+        df_inadimplencia[base_nomes],
+        lambda u: [t.split(' - ')[-1].strip() for t in _coluna_texto(u)]
+    )
+    pago = pd.to_numeric(df_inadimplencia['VALOR_PAGO'], errors='coerce')
+    em_aberto = (pago.isna() | (pago == 0)).to_numpy()
+    colunas = {
+        'nome_base': nome_base,
+        'status': np.where(em_aberto, 'EM ABERTO', 'PAGO PARCIAL'),
+        'valor': pd.to_numeric(df_inadimplencia['VALOR_TITULO'], errors='coerce').to_numpy(dtype=float),
+    }
+    _FILTRO_DETALHE_CACHE['entrada'] = (df_inadimplencia, base_nomes, colunas)
+    return colunas
+
+def _filtrar_detalhamento(df_inadimplencia, ordem, base_nomes, vendedor='', status='', valor_min=None):
+    """Mantém das posições ordenadas só os títulos que passam nos filtros da tela
+    (vendedor, status do título e valor mínimo), com o mesmo critério que o filtro aplicava no navegador.
+    """
+    if not (vendedor or status or valor_min is not None):
+        return ordem
+    colunas = _colunas_filtro_detalhamento(df_inadimplencia, base_nomes)
+    mascara = np.ones(len(df_inadimplencia), dtype=bool)
+    if vendedor:
+        mascara &= colunas['nome_base'] == vendedor
+    if status:
+        mascara &= colunas['status'] == status
+    if valor_min is not None:
+        mascara &= colunas['valor'] >= valor_min
+    return ordem[mascara[ordem]]
+
+def _linhas_detalhamento(df_inadimplencia, ordem, base_nomes, obs_por_cliente):
+    """Linhas <tr> do detalhamento para as posições em `ordem`.
+    Só as colunas exibidas são reordenadas (take), sem copiar o DataFrame inteiro.
+    """
+    if len(ordem) == 0:
+        return []
+    
+    def det(coluna):
+        return df_inadimplencia[coluna].take(ordem)
+    
+    # Detalhamento vetorizado: cada coluna vira um array de textos pronto para o template
+    n_det = len(ordem)
+    colunas_det = df_inadimplencia.columns
+    col_dup = 'DUPLICATA' if 'DUPLICATA' in colunas_det else ('DUPLIC' if 'DUPLIC' in colunas_det else None)
+    duplicata = _coluna_texto(det(col_dup), escapar=True) if col_dup else np.full(n_det, '', dtype=object)
+    cod_cliente_txt = _por_valores_unicos(det('COD_CLIENTE'), _coluna_texto)
+    cod_cliente = _por_valores_unicos(cod_cliente_txt, _escapar_textos)
+    nome_cliente = _por_valores_unicos(det('NOME_CLIENTE'), lambda u: _coluna_texto(u, escapar=True))
+    nome_vendedor = _por_valores_unicos(det(base_nomes), lambda u: _coluna_texto(u, escapar=True))
+    valor = formatar_valor_serie(det('VALOR_TITULO')).to_numpy(dtype=object)
+    if 'DATA_EMISSAO' in colunas_det:
+        emissao = _por_valores_unicos(det('DATA_EMISSAO'), formatar_data_serie)
+    else:
+        emissao = np.full(n_det, '-', dtype=object)
+    vencimento = _por_valores_unicos(det('DATA_VENCIMENTO'), formatar_data_serie)
+    dias = _por_valores_unicos(det('DIAS_ATRASO'), _coluna_texto)
+    # Status do título: sem pagamento => EM ABERTO, senão PAGO PARCIAL
+    pago = pd.to_numeric(det('VALOR_PAGO'), errors='coerce')
+    em_aberto = (pago.isna() | (pago == 0)).to_numpy().astype(np.intp)
+    status_class = _STATUS_TITULO_CLASSE[em_aberto]
+    status_titulo = _STATUS_TITULO_TEXTO[em_aberto]
+    # Indicador de observações por cliente: uma busca vetorizada (dict simples => hash em C) sobre o código original
+    obs_count = pd.Series(cod_cliente_txt, dtype=object).map(dict(obs_por_cliente)).fillna(0).to_numpy(dtype=np.int32)
+    tem_obs = obs_count > 0
+    badge_estilo = np.where(tem_obs, '', ' style="display:none;"')
+    badge_texto = np.where(tem_obs, obs_count.astype(str), '')
+    # Uma formatação "%" por linha sobre as colunas já prontas (sem arrays intermediários por concatenação)
+    return list(map(_ROW_TPL_DETALHE.__mod__, zip(
+        duplicata, cod_cliente, nome_cliente, nome_vendedor, valor, emissao, vencimento, dias,
+        status_class, status_titulo, cod_cliente, nome_cliente, cod_cliente, badge_estilo.tolist(), badge_texto.tolist()
+    )))
+
+# Linhas do detalhamento enviadas por bloco no streaming (amortiza o custo por chunk do WSGI)
+HTML_STREAM_BATCH = max(1, int(os.environ.get('HTML_STREAM_BATCH', '512')))
+
+# Compressão gzip do relatório em streaming (HTML muito repetitivo: comprime dezenas de vezes)
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '5'))
+
+# Faixas do filtro "Dias Atraso" (cumulativas: 0 a N dias); opções do select e data-faixas das linhas saem daqui
+FAIXAS_DIAS = (5, 15, 30, 60, 120)
+
+# Detalhamento paginado: linhas enviadas no HTML inicial (as demais vêm de /api/linhas_detalhamento)
+DETALHE_PAGINA = max(1, int(os.environ.get('DETALHE_PAGINA', '200')))
+DETALHE_PAGINA_MAX = 2000
+# Ordem do detalhamento dos dados em cache: {'entrada': (df, coluna de nome, posições)}
+_ORDEM_DETALHE_CACHE = {}
+# Colunas de filtro do detalhamento pré-calculadas para os dados em cache:
+# {'entrada': (df, coluna de nome, {'nome_base', 'status', 'valor'})}
+_FILTRO_DETALHE_CACHE = {}
+
+# Respostas JSON (páginas do detalhamento, listas de observações) e estáticos de texto (JS/CSS) comprimidos
+# no after_request quando passam deste tamanho; o relatório HTML já sai comprimido pela própria rota
+GZIP_MIMETYPES = {'application/json', 'text/javascript', 'application/javascript', 'text/css'}
+GZIP_MIN_BYTES = 1024
+# Estáticos comprimidos uma vez por versão do arquivo: {(caminho, etag): bytes gzip}
+_ESTATICOS_GZ = {}
+
+# Cache do HTML pronto por hash do conteúdo (dados + observações + dia); guarda poucas versões (LRU)
+HTML_CACHE_MAX = int(os.environ.get('HTML_CACHE_MAX', '4'))
+_HTML_CACHE = OrderedDict()
+_HTML_CACHE_LOCK = threading.Lock()
+
+# Atalho para o cache acima: (assinatura do arquivo, observações, dia) -> chave de conteúdo do último relatório.
+# Com a mesma entrada o HTML sai do cache sem reler a planilha nem recalcular métricas e hash
+_RELATORIO_RAPIDO = {'chave_rapida': None, 'chave': None}
+
+# Templates das linhas das tabelas (interpretados uma vez; preenchidos com "%" e tupla, o caminho mais rápido do CPython)
+_ROW_TPL_RESUMO = """
+                            <tr class="linha-resumo" data-status="%s" data-vendedor="%s" data-faixas="%s" data-valor="%.2f">
+                                <td>%s</td>
+                                <td>%s</td>
+                                <td>%s</td>
+                                <td>%s</td>
+                            </tr>
+            """
+
+_ROW_TPL_DETALHE = (
+    '<tr><td>%s</td><td>%s</td><td>%s</td><td>%s</td><td><strong>%s</strong></td><td>%s</td><td>%s</td>'
+    '<td><strong>%s dias</strong></td><td class="%s">%s</td>'
+    '<td><button class="btn-obs" data-cod="%s" data-nome="%s">📝 Obs '
+    '<span id="obs-badge-%s" class="obs-badge"%s>%s</span></button></td></tr>\n'
+)
+
+# Cabeçalho do relatório (filtros, cards e início da tabela de resumo) compilado uma vez na importação;
+# os estilos ficam em static/relatorio.css (versionado por conteúdo, cache longo no navegador);
+# cada requisição só preenche as variáveis. autoescape escapa os valores interpolados
+_TPL_CABECALHO_RELATORIO = _JINJA.from_string("""
         <!DOCTYPE html>
         <html lang="pt-BR">
         <head>
             <meta charset="UTF-8">
             <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>Relatório de Inadimplência - {hoje.strftime('%d/%m/%Y')}</title>
-            <style>
-                body {{
-                    font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                    margin: 0;
-                    padding: 20px;
-                    background-color: #f5f5f5;
-                    color: #333;
-                }}
-                .container {{
-                    max-width: 1200px;
-                    margin: 0 auto;
-                    background-color: white;
-                    border-radius: 10px;
-                    box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-                    overflow: hidden;
-                }}
-                .header {{
-                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                    color: white;
-                    padding: 30px;
-                    text-align: center;
-                }}
-                .header h1 {{
-                    margin: 0;
-                    font-size: 2.5em;
-                    font-weight: 300;
-                }}
-                .header p {{
-                    margin: 10px 0 0 0;
-                    font-size: 1.1em;
-                    opacity: 0.9;
-                }}
-                .clock {{
-                    margin-top: 8px;
-                    color: #ffffff;
-                    font-weight: 600;
-                    text-align: center;
-                }}
-                .upload-inline {{
-                    display: flex;
-                    gap: 10px;
-                    justify-content: center;
-                    align-items: center;
-                    margin-top: 10px;
-                }}
-                .upload-inline input[type="file"] {{
-                    display: none;
-                }}
-                .upload-inline .file-label {{
-                    background: #17a2b8;
-                    color: white;
-                    padding: 8px 14px;
-                    border-radius: 6px;
-                    cursor: pointer;
-                    font-weight: 600;
-                }}
-                .upload-inline .btn-upload {{
-                    background: #28a745;
-                    color: white;
-                    border: none;
-                    padding: 8px 14px;
-                    border-radius: 6px;
-                    font-weight: 600;
-                    cursor: pointer;
-                }}
-                .periodo {{
-                    background-color: #f8f9fa;
-                    padding: 15px;
-                    text-align: center;
-                    border-bottom: 1px solid #e9ecef;
-                }}
-                .periodo strong {{
-                    color: #495057;
-                }}
-                .resumo {{
-                    display: grid;
-                    grid-template-columns: repeat(auto-fit, minmax(250px, 1fr));
-                    gap: 20px;
-                    padding: 30px;
-                    background-color: #f8f9fa;
-                }}
-                .card {{
-                    background: white;
-                    padding: 25px;
-                    border-radius: 8px;
-                    box-shadow: 0 2px 4px rgba(0, 0, 0, 0.1);
-                    text-align: center;
-                }}
-                .card h3 {{
-                    margin: 0 0 15px 0;
-                    color: #495057;
-                    font-size: 1.1em;
-                }}
-                .card .valor {{
-                    font-size: 2em;
-                    font-weight: bold;
-                    color: #dc3545;
-                }}
-                .card .label {{
-                    font-size: 0.9em;
-                    color: #6c757d;
-                    margin-top: 5px;
-                }}
-                .tabela-container {{
-                    padding: 30px;
-                }}
-                .tabela-scroll {{
-                    overflow-x: auto;
-                }}
-                .tabela-container h2 {{
-                    color: #495057;
-                    margin-bottom: 20px;
-                    font-size: 1.5em;
-                }}
-                table {{
-                    width: 100%;
-                    border-collapse: collapse;
-                    margin-bottom: 30px;
-                    background: white;
-                    border-radius: 8px;
-                    overflow: hidden;
-                    box-shadow: 0 2px 4px rgba(0, 0, 0, 0.1);
-                }}
-                thead th {{ position: sticky; top: 0; background: #ffffff; z-index: 1; }}
-                th, td {{ white-space: nowrap; }}
-                th {{
-                    background-color: #ffffff;
-                    color: #000000;
-                    padding: 15px;
-                    text-align: left;
-                    font-weight: 600;
-                }}
-                td {{
-                    padding: 12px 15px;
-                    border-bottom: 1px solid #e9ecef;
-                }}
-                tr:hover {{
-                    background-color: #f8f9fa;
-                }}
-                .status-bom {{
-                    color: #28a745;
-                    font-weight: bold;
-                }}
-                .status-medio {{
-                    color: #ffc107;
-                    font-weight: bold;
-                }}
-                .status-ruim {{
-                    color: #dc3545;
-                    font-weight: bold;
-                }}
-                .footer {{
-                    background-color: #495057;
-                    color: white;
-                    text-align: center;
-                    padding: 20px;
-                    font-size: 0.9em;
-                }}
-                /* removed bottom observacoes-section styles */
-                .form-group {{
-                    margin-bottom: 20px;
-                }}
-                .form-group label {{
-                    display: block;
-                    margin-bottom: 8px;
-                    color: #495057;
-                    font-weight: 600;
-                }}
-                .form-group input, .form-group textarea {{
-                    width: 100%;
-                    padding: 12px;
-                    border: 1px solid #ced4da;
-                    border-radius: 4px;
-                    font-size: 14px;
-                    font-family: inherit;
-                }}
-                .form-group textarea {{
-                    min-height: 120px;
-                    resize: vertical;
-                }}
-                .btn-enviar {{
-                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                    color: white;
-                    border: none;
-                    padding: 12px 30px;
-                    border-radius: 6px;
-                    font-size: 16px;
-                    font-weight: 600;
-                    cursor: pointer;
-                    transition: all 0.3s ease;
-                }}
-                .btn-enviar:hover {{
-                    transform: translateY(-2px);
-                    box-shadow: 0 4px 8px rgba(0, 0, 0, 0.2);
-                }}
-                .info-observacao {{ background-color: #e3f2fd; border: 1px solid #2196f3; border-radius: 6px; padding: 15px; margin-bottom: 20px; color: #1976d2; }}
-                .observacoes-lista {{ margin-top: 10px; background: white; padding: 15px; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }}
-                .observacao-item {{
-                    border-bottom: 1px solid #e9ecef;
-                    padding: 15px 0;
-                }}
-                .observacao-item:last-child {{
-                    border-bottom: none;
-                }}
-                .observacao-header {{
-                    display: flex;
-                    justify-content: space-between;
-                    margin-bottom: 10px;
-                }}
-                .observacao-vendedor {{
-                    font-weight: bold;
-                    color: #495057;
-                }}
-                .observacao-data {{
-                    color: #6c757d;
-                    font-size: 0.9em;
-                }}
-                .observacao-texto {{
-                    color: #333;
-                    line-height: 1.5;
-                }}
-                .btn-atualizar {{
-                    background: #28a745;
-                    color: white;
-                    border: none;
-                    padding: 10px 20px;
-                    border-radius: 4px;
-                    cursor: pointer;
-                    margin-bottom: 20px;
-                }}
-                .btn-obs {{
-                    background: #17a2b8;
-                    color: white;
-                    border: none;
-                    padding: 6px 10px;
-                    border-radius: 4px;
-                    cursor: pointer;
-                    font-weight: 600;
-                }}
-                .obs-badge {{
-                    background: #ffc107;
-                    color: #212529;
-                    border-radius: 10px;
-                    padding: 2px 6px;
-                    font-size: 0.8em;
-                    margin-left: 6px;
-                    display: inline-block;
-                }}
-                .modal {{
-                    position: fixed;
-                    left: 0;
-                    top: 0;
-                    width: 100%;
-                    height: 100%;
-                    background: rgba(0,0,0,0.4);
-                    display: none;
-                    align-items: center;
-                    justify-content: center;
-                    z-index: 1000;
-                }}
-                .modal-content {{
-                    background: #ffffff;
-                    max-width: 700px;
-                    width: 90%;
-                    padding: 20px;
-                    border-radius: 8px;
-                    max-height: 80vh;
-                    overflow-y: auto;
-                    box-shadow: 0 2px 10px rgba(0,0,0,0.2);
-                }}
-                .modal-close {{
-                    float: right;
-                    cursor: pointer;
-                    font-size: 24px;
-                    line-height: 1;
-                }}
-                .filtros-section {{
-                    padding: 20px;
-                    background-color: #f8f9fa;
-                    border-bottom: 1px solid #e9ecef;
-                }}
-                .filtros-container {{
-                    display: flex;
-                    gap: 15px;
-                    flex-wrap: wrap;
-                    align-items: center;
-                    justify-content: center;
-                }}
-                .filtro-item {{
-                    display: flex;
-                    flex-direction: column;
-                    align-items: center;
-                }}
-                .filtro-item label {{
-                    font-weight: 600;
-                    color: #495057;
-                    margin-bottom: 5px;
-                    font-size: 0.9em;
-                }}
-                .filtro-item select, .filtro-item input {{
-                    padding: 8px 12px;
-                    border: 1px solid #ced4da;
-                    border-radius: 4px;
-                    font-size: 14px;
-                    min-width: 150px;
-                }}
-                .btn-filtrar {{
-                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                    color: white;
-                    border: none;
-                    padding: 8px 20px;
-                    border-radius: 4px;
-                    cursor: pointer;
-                    font-weight: 600;
-                    transition: all 0.3s ease;
-                }}
-                .btn-filtrar:hover {{
-                    transform: translateY(-1px);
-                    box-shadow: 0 2px 4px rgba(0, 0, 0, 0.2);
-                }}
-                .btn-limpar {{
-                    background: #6c757d;
-                    color: white;
-                    border: none;
-                    padding: 8px 20px;
-                    border-radius: 4px;
-                    cursor: pointer;
-                    font-weight: 600;
-                    transition: all 0.3s ease;
-                }}
-                .btn-limpar:hover {{
-                    background: #5a6268;
-                }}
-                .filtro-ativo {{
-                    background-color: #e3f2fd;
-                    border: 2px solid #2196f3;
-                    padding: 15px;
-                    border-radius: 8px;
-                    margin-bottom: 20px;
-                    text-align: center;
-                }}
-                .filtro-ativo strong {{
-                    color: #1976d2;
-                }}
-                @media (max-width: 768px) {{
-                    .resumo {{
-                        grid-template-columns: 1fr;
-                    }}
-                    table {{
-                        font-size: 0.9em;
-                    }}
-                    th, td {{
-                        padding: 8px;
-                    }}
-                    .form-observacao {{
-                        margin: 0 15px;
-                    }}
-                    .filtros-container {{
-                        flex-direction: column;
-                        gap: 10px;
-                    }}
-                    .filtro-item select, .filtro-item input {{
-                        min-width: 200px;
-                    }}
-                }}
-            </style>
+            <title>Relatório de Inadimplência - {{ hoje }}</title>
+            <link rel="stylesheet" href="/static/relatorio.css?v={{ versao_css }}">
         </head>
         <body>
             <div class="container">
@@ -1247,7 +1919,7 @@ def gerar_html_relatorio(df_inadimplencia, df_metricas, observacoes):
                 </div>
                 
                 <div class="periodo">
-                    <strong>Período de Análise:</strong> {data_inicio.strftime('%d/%m/%Y')} até {data_fim.strftime('%d/%m/%Y')}
+                    <strong>Período de Análise:</strong> {{ data_inicio }} até {{ data_fim }}
                 </div>
                 
                 <div class="filtros-section">
@@ -1257,7 +1929,7 @@ def gerar_html_relatorio(df_inadimplencia, df_metricas, observacoes):
                             <label for="filtro-vendedor">Vendedor:</label>
                             <select id="filtro-vendedor">
                                 <option value="">Todos os Vendedores</option>
-                                {opcoes_vendedores}
+                                {{ opcoes_vendedores }}
                             </select>
                         </div>
                         <div class="filtro-item">
@@ -1273,11 +1945,7 @@ def gerar_html_relatorio(df_inadimplencia, df_metricas, observacoes):
                             <label for="filtro-dias">Dias Atraso:</label>
                             <select id="filtro-dias">
                                 <option value="">Todos</option>
-                                <option value="0-5">0-5 dias</option>
-                                <option value="0-15">0-15 dias</option>
-                                <option value="0-30">0-30 dias</option>
-                                <option value="0-60">0-60 dias</option>
-                                <option value="0-120">0-120 dias</option>
+                                {{ opcoes_faixas }}
                             </select>
                         </div>
                         <div class="filtro-item">
@@ -1297,22 +1965,22 @@ def gerar_html_relatorio(df_inadimplencia, df_metricas, observacoes):
                 <div class="resumo">
                     <div class="card">
                         <h3>💰 Valor Total</h3>
-                        <div class="valor">{formatar_valor(total_valor_inadimplencia)}</div>
+                        <div class="valor">{{ total_valor_inadimplencia }}</div>
                         <div class="label">Títulos em Inadimplência</div>
                     </div>
                     <div class="card">
                         <h3>📄 Quantidade</h3>
-                        <div class="valor">{total_titulos:,}</div>
+                        <div class="valor">{{ total_titulos }}</div>
                         <div class="label">Títulos</div>
                     </div>
                     <div class="card">
                         <h3>💳 Valor Pago</h3>
-                        <div class="valor">{formatar_valor(total_valor_pago)}</div>
+                        <div class="valor">{{ total_valor_pago }}</div>
                         <div class="label">Total Pago</div>
                     </div>
                     <div class="card">
                         <h3>⚠️ Em Aberto</h3>
-                        <div class="valor">{formatar_valor(total_em_aberto)}</div>
+                        <div class="valor">{{ total_em_aberto }}</div>
                         <div class="label">Valor Pendente</div>
                     </div>
                 </div>
@@ -1330,33 +1998,10 @@ def gerar_html_relatorio(df_inadimplencia, df_metricas, observacoes):
                             </tr>
                         </thead>
                         <tbody>
-        """
-        
-        # Adicionar linhas da tabela
-        for _, row in df_metricas.iterrows():
-            # Determinar status baseado no percentual
-            percentual = row['%_INADIMPLENCIA']
-            if percentual <= 10:
-                status_class = "status-bom"
-                status_text = "BOM"
-            elif percentual <= 20:
-                status_class = "status-medio"
-                status_text = "MÉDIO"
-            else:
-                status_class = "status-ruim"
-                status_text = "RUIM"
-            
-            nome_vendedor_resumo = row['NOME_VENDEDOR']
-            html_content += f"""
-                            <tr>
-                                <td>{row['COD_VENDEDOR']}</td>
-                                <td>{nome_vendedor_resumo}</td>
-                                <td>{formatar_valor(row['VALOR_EM_ABERTO'])}</td>
-                                <td>{row['QTD_TITULOS']:,}</td>
-                            </tr>
-            """
-        
-        html_content += """
+        """)
+
+# Trecho fixo entre a tabela de resumo e o detalhamento (sem variáveis: constante criada na importação)
+_HTML_INICIO_DETALHAMENTO = """
                         </tbody>
                     </table>
                     </div>
@@ -1380,49 +2025,17 @@ def gerar_html_relatorio(df_inadimplencia, df_metricas, observacoes):
                         </thead>
                         <tbody>
         """
-        
-        # Adicionar detalhamento por cliente (ordenado por vendedor em ordem alfabética)
-        col_vendedor_sort = 'NOME_UNIFICADO' if 'NOME_UNIFICADO' in df_inadimplencia.columns else 'NOME_VENDEDOR'
-        try:
-            df_inadimplencia_ordenado = df_inadimplencia.sort_values([col_vendedor_sort, 'NOME_CLIENTE'], ascending=[True, True])
-        except Exception:
-            df_inadimplencia_ordenado = df_inadimplencia.sort_values(col_vendedor_sort, ascending=True)
-        
-        for _, row in df_inadimplencia_ordenado.iterrows():
-            # Determinar status do título
-            if pd.isna(row['VALOR_PAGO']) or row['VALOR_PAGO'] == 0:
-                status_titulo = "EM ABERTO"
-                status_class = "status-ruim"
-            else:
-                status_titulo = "PAGO PARCIAL"
-                status_class = "status-medio"
-            
-            cod_cliente = str(row['COD_CLIENTE'])
-            nome_cliente_js = str(row['NOME_CLIENTE']).replace("'", "\\'")
-            obs_count = obs_por_cliente.get(cod_cliente, 0)
-            badge_str = f"<span id=\"obs-badge-{cod_cliente}\" class=\"obs-badge\">{obs_count}</span>" if obs_count > 0 else f"<span id=\"obs-badge-{cod_cliente}\" class=\"obs-badge\" style=\"display:none;\"></span>"
-            nome_vendedor_detalhe = row['NOME_UNIFICADO'] if 'NOME_UNIFICADO' in df_inadimplencia.columns else row['NOME_VENDEDOR']
-            html_content += f"""
-                            <tr>
-                                <td>{row['DUPLICATA'] if 'DUPLICATA' in df_inadimplencia.columns else (row['DUPLIC'] if 'DUPLIC' in df_inadimplencia.columns else '')}</td>
-                                <td>{row['COD_CLIENTE']}</td>
-                                <td>{row['NOME_CLIENTE']}</td>
-                                <td>{nome_vendedor_detalhe}</td>
-                                <td><strong>{formatar_valor(row['VALOR_TITULO'])}</strong></td>
-                                <td>{formatar_data(row['DATA_EMISSAO']) if 'DATA_EMISSAO' in df_inadimplencia.columns else '-'}</td>
-                                <td>{formatar_data(row['DATA_VENCIMENTO'])}</td>
-                                <td><strong>{row['DIAS_ATRASO']} dias</strong></td>
-                                <td class="{status_class}">{status_titulo}</td>
-                                <td>
-                                    <button class="btn-obs" onclick="openObsModal('{cod_cliente}', '{nome_cliente_js}')">📝 Obs {badge_str}</button>
-                                </td>
-                            </tr>
-            """
-        
-        html_content += f"""
+
+# Rodapé do relatório (fim do detalhamento, "carregar mais", modal de observações e script) compilado uma vez;
+# cada requisição só preenche contagens, datas e a versão do JS
+_TPL_RODAPE_RELATORIO = _JINJA.from_string("""
                         </tbody>
                     </table>
                     </div>
+                    <div id="detalhe-mais" class="detalhe-mais" data-offset="{{ exibidos }}" data-total="{{ total }}" data-limite="{{ limite }}">
+                        <span id="detalhe-info">Exibindo {{ exibidos_fmt }} de {{ total_fmt }} títulos</span>
+                        <button type="button" id="btn-carregar-mais" class="btn-carregar-mais" onclick="carregarDetalhes(false)"{% if exibidos >= total %} style="display:none;"{% endif %}>Carregar mais</button>
+                    </div>
                 </div>
                 
                 <!-- Modal de Observações por Cliente -->
@@ -1444,7 +2057,7 @@ def gerar_html_relatorio(df_inadimplencia, df_metricas, observacoes):
                                 </div>
                                 <div class="form-group">
                                     <label for="obsData">Data da Observação:</label>
-                                    <input type="date" id="obsData" name="data_observacao" value="{hoje.strftime('%Y-%m-%d')}" required>
+                                    <input type="date" id="obsData" name="data_observacao" value="{{ hoje_iso }}" required>
                                 </div>
                                 <button type="submit" class="btn-enviar">Salvar Observação</button>
                             </form>
@@ -1455,306 +2068,315 @@ def gerar_html_relatorio(df_inadimplencia, df_metricas, observacoes):
                 <!-- Removida seção de observações no rodapé -->
                 
                 <div class="footer">
-                    <p>Relatório gerado em {hoje.strftime('%d/%m/%Y às %H:%M')}</p>
+                    <p>Relatório gerado em {{ gerado_em }}</p>
                     <p>Sistema de Gestão de Inadimplência</p>
                 </div>
             </div>
             
-            <script>
-            // Upload embutido no cabeçalho (evita f-string dentro do atributo onsubmit)
-            (function(){{
-                const form = document.getElementById('uploadFormInline');
-                if (form) {{
-                    form.addEventListener('submit', function(e) {{
-                        e.preventDefault();
-                        const fileInput = document.getElementById('arquivoInline');
-                        if (!fileInput || fileInput.files.length === 0) {{
-                            alert('Selecione um arquivo.');
-                            return;
-                        }}
-                        const fd = new FormData(form);
-                        fetch('/upload', {{ method: 'POST', body: fd }})
-                            .then(r => r.json())
-                            .then(d => {{ if (d.success) {{ location.reload(); }} else {{ alert('Erro: ' + d.error); }} }})
-                            .catch(err => alert('Erro no upload: ' + err));
-                    }});
-                }}
-            }})();
-            function enviarObservacao(event) {{
-                event.preventDefault();
-                
-                // Coletar dados do formulário
-                const formData = new FormData(event.target);
-                const dados = {{
-                    nome_vendedor: formData.get('nome_vendedor'),
-                    codigo_vendedor: formData.get('codigo_vendedor'),
-                    observacao: formData.get('observacao'),
-                    data_observacao: formData.get('data_observacao')
-                }};
-                
-                // Enviar para o servidor
-                fetch('/salvar_observacao', {{
-                    method: 'POST',
-                    headers: {{
-                        'Content-Type': 'application/json',
-                    }},
-                    body: JSON.stringify(dados)
-                }})
-                .then(response => response.json())
-                .then(data => {{
-                    if (data.success) {{
-                        alert('✅ Observação enviada com sucesso!');
-                        event.target.reset();
-                        atualizarObservacoes();
-                    }} else {{
-                        alert('❌ Erro ao enviar observação: ' + data.error);
-                    }}
-                }})
-                .catch(error => {{
-                    alert('❌ Erro ao enviar observação: ' + error);
-                }});
-            }}
-            
-            function atualizarObservacoes() {{
-                location.reload();
-            }}
-            
-            // ---- Observações por Cliente (modal) ----
-            let obsModalCodigoAtual = null;
-            function openObsModal(codigo, nome) {{
-                obsModalCodigoAtual = String(codigo);
-                document.getElementById('obsClienteCodigo').textContent = obsModalCodigoAtual;
-                document.getElementById('obsClienteNome').textContent = nome;
-                document.getElementById('obsCodigoCliente').value = obsModalCodigoAtual;
-                document.getElementById('obsModal').style.display = 'flex';
-                carregarObsDoCliente(obsModalCodigoAtual);
-            }}
-            function closeObsModal() {{
-                document.getElementById('obsModal').style.display = 'none';
-            }}
-            function carregarObsDoCliente(codigo) {{
-                fetch('/observacoes_por_cliente/' + encodeURIComponent(codigo))
-                    .then(r => r.json())
-                    .then(data => {{
-                        const listaDiv = document.getElementById('obsLista');
-                        if (!data.success) {{
-                            listaDiv.innerHTML = '<div class="info-observacao">Erro ao carregar observações.</div>';
-                            return;
-                        }}
-                        const obs = data.observacoes || [];
-                        if (obs.length === 0) {{
-                            listaDiv.innerHTML = '<div class="info-observacao">Nenhuma observação para este cliente.</div>';
-                        }} else {{
-                            listaDiv.innerHTML = obs.slice().reverse().map(o => {{
-                                let d = o.data_envio || o.data_observacao;
-                                try {{ d = new Date(d).toLocaleString('pt-BR'); }} catch (e) {{}}
-                                return `<div class="observacao-item">`
-                                    + `<div class=\"observacao-header\">`
-                                    + `<span class=\"observacao-vendedor\">${{o.nome_vendedor || '-'}}` + `</span>`
-                                    + `<span class=\"observacao-data\">${{d || ''}}</span>`
-                                    + `</div>`
-                                    + `<div class=\"observacao-texto\">${{o.observacao || ''}}</div>`
-                                    + `</div>`;
-                            }}).join('');
-                        }}
-                        atualizarBadge(codigo, obs.length);
-                    }})
-                    .catch(_ => {{
-                        document.getElementById('obsLista').innerHTML = '<div class="info-observacao">Erro ao carregar observações.</div>';
-                    }});
-            }}
-            function salvarObsDoCliente(event) {{
-                event.preventDefault();
-                const dados = {{
-                    nome_vendedor: document.getElementById('obsNomeVendedor').value,
-                    codigo_vendedor: document.getElementById('obsCodigoCliente').value,
-                    observacao: document.getElementById('obsTexto').value,
-                    data_observacao: document.getElementById('obsData').value
-                }};
-                fetch('/salvar_observacao', {{
-                    method: 'POST',
-                    headers: {{ 'Content-Type': 'application/json' }},
-                    body: JSON.stringify(dados)
-                }})
-                .then(r => r.json())
-                .then(d => {{
-                    if (d.success) {{
-                        document.getElementById('obsTexto').value = '';
-                        carregarObsDoCliente(obsModalCodigoAtual);
-                    }} else {{
-                        alert('❌ Erro ao salvar observação: ' + (d.error || ''));
-                    }}
-                }})
-                .catch(err => alert('❌ Erro ao salvar observação: ' + err));
-            }}
-            function atualizarBadge(codigo, count) {{
-                const badge = document.getElementById('obs-badge-' + codigo);
-                if (!badge) return;
-                const n = Number(count || 0);
-                if (n > 0) {{
-                    badge.textContent = n;
-                    badge.style.display = 'inline-block';
-                }} else {{
-                    badge.style.display = 'none';
-                }}
-            }}
-            // ---- fim observações por cliente ----
-
-            // Funções de filtro
-            function aplicarFiltros() {{
-                const vendedor = document.getElementById('filtro-vendedor').value;
-                const status = document.getElementById('filtro-status').value;
-                const dias = document.getElementById('filtro-dias').value;
-                const valor = document.getElementById('filtro-valor').value;
-                
-                // Mostrar informações do filtro ativo
-                let filtrosAtivos = [];
-                if (vendedor) filtrosAtivos.push(`Vendedor: ${{vendedor}}`);
-                if (status) filtrosAtivos.push(`Status: ${{status}}`);
-                if (dias) filtrosAtivos.push(`Dias: ${{dias}}`);
-                if (valor) filtrosAtivos.push(`Valor mínimo: R$ ${{parseFloat(valor).toFixed(2)}}`);
-                
-                const filtroInfo = document.getElementById('filtro-ativo-info');
-                if (filtrosAtivos.length > 0) {{
-                    filtroInfo.innerHTML = `<div class="filtro-ativo"><strong>Filtros Ativos:</strong> ${{filtrosAtivos.join(' | ')}}</div>`;
-                    filtroInfo.style.display = 'block';
-                }} else {{
-                    filtroInfo.style.display = 'none';
-                }}
-                
-                // Aplicar filtros nas tabelas
-                filtrarTabelaResumo(vendedor, status, dias, valor);
-                filtrarTabelaDetalhamento(vendedor, status, dias, valor);
-            }}
-            
-            function limparFiltros() {{
-                document.getElementById('filtro-vendedor').value = '';
-                document.getElementById('filtro-status').value = '';
-                document.getElementById('filtro-dias').value = '';
-                document.getElementById('filtro-valor').value = '';
-                document.getElementById('filtro-ativo-info').style.display = 'none';
-                
-                // Mostrar todas as linhas
-                const tabelaResumo = document.getElementById('tabela-resumo');
-                const tabelaDetalhamento = document.getElementById('tabela-detalhamento');
-                
-                if (tabelaResumo) {{
-                    const linhasResumo = tabelaResumo.querySelectorAll('tbody tr');
-                    linhasResumo.forEach(tr => {{
-                        tr.style.display = '';
-                    }});
-                }}
-                
-                if (tabelaDetalhamento) {{
-                    const linhasDetalhamento = tabelaDetalhamento.querySelectorAll('tbody tr');
-                    linhasDetalhamento.forEach(tr => {{
-                        tr.style.display = '';
-                    }});
-                }}
-            }}
-            
-            function filtrarTabelaResumo(vendedor, status, dias, valor) {{
-                const tabela = document.getElementById('tabela-resumo');
-                const linhas = tabela.querySelectorAll('tbody tr');
-                
-                linhas.forEach(linha => {{
-                    const colunas = linha.querySelectorAll('td');
-                    if (colunas.length >= 6) {{
-                        const nomeVendedorLinha = colunas[1].textContent.trim();
-                        const diasMedio = parseFloat(colunas[4].textContent.replace(' dias', ''));
-                        const valorTotal = parseFloat(colunas[2].textContent.replace('R$ ', '').replace('.', '').replace(',', '.'));
-                        
-                        let mostrar = true;
-                        
-                        if (vendedor && nomeVendedorLinha !== vendedor) mostrar = false;
-                        if (dias && !filtrarPorDias(diasMedio, dias)) mostrar = false;
-                        if (valor && valorTotal < parseFloat(valor)) mostrar = false;
-                        
-                        linha.style.display = mostrar ? '' : 'none';
-                    }}
-                }});
-            }}
-            
-                         function filtrarTabelaDetalhamento(vendedor, status, dias, valor) {{
-                const tabelaDetalhamento = document.getElementById('tabela-detalhamento');
-                const linhas = tabelaDetalhamento.querySelectorAll('tbody tr');
-                
-                linhas.forEach(linha => {{
-                    const colunas = linha.querySelectorAll('td');
-                    if (colunas.length >= 10) {{
-                        // 0 Duplicata, 1 COD Cliente, 2 Nome Cliente, 3 Vendedor, 4 Valor, 5 Emissão, 6 Vencimento, 7 Dias, 8 Status, 9 Obs
-                        const nomeVendedor = colunas[3].textContent.trim();
-                        const nomeBase = nomeVendedor.includes(' - ')
-                            ? nomeVendedor.split(' - ').slice(-1)[0].trim()
-                            : nomeVendedor.trim();
-                        const statusLinha = colunas[8].textContent.trim();
-                        const diasAtraso = parseFloat(colunas[7].textContent.replace(' dias', ''));
-                        const valorTitulo = parseFloat(colunas[4].textContent.replace('R$ ', '').replace('.', '').replace(',', '.'));
-                        
-                        let mostrar = true;
-                        
-                        if (vendedor && nomeBase !== vendedor) mostrar = false;
-                        if (status && statusLinha !== status) mostrar = false;
-                        // Detalhamento: priorizar filtro por Vendedor
-                        if (valor && valorTitulo < parseFloat(valor)) mostrar = false;
-                        
-                        linha.style.display = mostrar ? '' : 'none';
-                    }}
-                }});
-             }}
-            
-            function filtrarPorDias(dias, filtro) {{
-                switch(filtro) {{
-                    case '0-5': return dias >= 0 && dias <= 5;
-                    case '0-15': return dias >= 0 && dias <= 15;
-                    case '0-30': return dias >= 0 && dias <= 30;
-                    case '0-60': return dias >= 0 && dias <= 60;
-                    case '0-120': return dias >= 0 && dias <= 120;
-                    default: return true;
-                }}
-            }}
-            
-            // Auto-preenchimento do código do vendedor baseado na URL
-            window.onload = function() {{
-                const urlParams = new URLSearchParams(window.location.search);
-                const vendedor = urlParams.get('vendedor');
-                if (vendedor) {{
-                    const codigoVEl = document.getElementById('codigo_vendedor');
-                    if (codigoVEl) {{ codigoVEl.value = vendedor; }}
-                    document.getElementById('filtro-vendedor').value = vendedor;
-                    aplicarFiltros(); // Aplicar filtro automaticamente
-                }}
-                // Relógio e keepalive
-                function updateClock() {{
-                    const el = document.getElementById('keepaliveClock');
-                    if (!el) return;
-                    const now = new Date();
-                    const hh = String(now.getHours()).padStart(2,'0');
-                    const mm = String(now.getMinutes()).padStart(2,'0');
-                    const ss = String(now.getSeconds()).padStart(2,'0');
-                    el.textContent = hh + ':' + mm + ':' + ss;
-                }}
-                setInterval(updateClock, 1000);
-                updateClock();
-                setInterval(() => {{ fetch('/ping').catch(()=>{{}}); }}, 30000);
-            }};
-            </script>
+            <script src="/static/relatorio.js?v={{ versao_js }}"></script>
         </body>
         </html>
-        """
+        """)
+
+def gerar_html_relatorio(df_inadimplencia, df_metricas, observacoes, periodo=None):
+    """Gera HTML do relatório como um gerador de partes em UTF-8 (cabeçalho, linhas do detalhamento, rodapé).
+    A preparação roda antes de retornar, então falhas ainda resultam em None (erro 500 na rota).
+    """
+    try:
+        periodo = periodo or periodo_relatorio()
+        hoje, data_inicio, data_fim = periodo.hoje, periodo.inicio, periodo.fim
+        
+        # Calcular totais
+        somas = df_inadimplencia[['VALOR_TITULO', 'VALOR_PAGO']].sum()
+        total_valor_inadimplencia = somas['VALOR_TITULO']
+        total_valor_pago = somas['VALOR_PAGO']
+        total_titulos = len(df_inadimplencia)
+        total_em_aberto = total_valor_inadimplencia - total_valor_pago
+        
+        # Coluna de nome do vendedor (unificado, se existir) decidida uma vez para filtro, ordenação e detalhamento
+        base_nomes = _coluna_nome_vendedor(df_inadimplencia)
+        
+        # Gerar opções de vendedores para o filtro com unificação
+        # unique() sobre a coluna (ordem de aparição); escape e concatenação vetorizados, um único join no fim
+        nomes_unicos = pd.Series(df_inadimplencia[base_nomes].unique(), dtype=object)
+        nomes_unicos = _coluna_texto(nomes_unicos.mask(nomes_unicos.map(lambda n: n is None), ""), escapar=True)
+        opcoes_vendedores = "".join('<option value="' + nomes_unicos + '">' + nomes_unicos + '</option>')
+        opcoes_faixas = "".join(f'<option value="0-{f}">0-{f} dias</option>' for f in FAIXAS_DIAS)
+        
+        # Mapa de quantidade de observações por cliente (para indicador na tabela)
+        obs_por_cliente = _contar_obs_por_cliente(observacoes)
+        
+        # Gerar HTML (partes acumuladas em lista e unidas uma única vez no final)
+        partes = []
+        partes.append(_TPL_CABECALHO_RELATORIO.render(
+            versao_css=_VERSAO_CSS,
+            hoje=hoje.strftime('%d/%m/%Y'),
+            data_inicio=data_inicio.strftime('%d/%m/%Y'),
+            data_fim=data_fim.strftime('%d/%m/%Y'),
+            # Opções já escapadas item a item: Markup evita o escape duplo do autoescape
+            opcoes_vendedores=Markup(opcoes_vendedores),
+            opcoes_faixas=Markup(opcoes_faixas),
+            total_valor_inadimplencia=formatar_valor(total_valor_inadimplencia),
+            total_titulos=f"{total_titulos:,}",
+            total_valor_pago=formatar_valor(total_valor_pago),
+            total_em_aberto=formatar_valor(total_em_aberto),
+        ))
+        
+        # Adicionar linhas da tabela
+        # Linhas vão para a lista `partes` (unida/enviada em blocos no streaming), nunca por += numa string crescente
+        # Status por vendedor classificado de uma vez: até 10% BOM, até 20% MÉDIO, acima disso (ou sem %) RUIM
+        # (tabela indexada por np.searchsorted; NaN ordena após os limites e cai em RUIM)
+        status_resumo = _STATUS_RESUMO[np.searchsorted(
+            _STATUS_LIMITES, df_metricas['%_INADIMPLENCIA'].to_numpy(dtype=float), side='left')]
+        # Faixas de dias (cumulativas) em que o atraso médio de cada vendedor se enquadra, ex.: "0-30 0-60 0-120"
+        dias_medio = df_metricas['DIAS_ATRASO_MEDIO'].to_numpy(dtype=float)
+        faixas_resumo = np.full(len(dias_medio), '', dtype=object)
+        for f in FAIXAS_DIAS:
+            faixas_resumo = np.where((dias_medio >= 0) & (dias_medio <= f), faixas_resumo + f' 0-{f}', faixas_resumo)
+        # Valores crus vão em data-* para o filtro do navegador não reinterpretar texto formatado.
+        # Colunas preparadas inteiras (escape e formatação vetorizados) e linhas montadas por um único map do template
+        nomes_resumo = _coluna_texto(df_metricas['NOME_VENDEDOR'], escapar=True)
+        partes.extend(map(_ROW_TPL_RESUMO.__mod__, zip(
+            status_resumo, nomes_resumo, [f.strip() for f in faixas_resumo], df_metricas['VALOR_EM_ABERTO'].tolist(),
+            _coluna_texto(df_metricas['COD_VENDEDOR'], escapar=True), nomes_resumo,
+            df_metricas['VALOR_EM_ABERTO_FMT'].tolist(), [f"{q:,}" for q in df_metricas['QTD_TITULOS'].tolist()]
+        )))
+        
+        partes.append(_HTML_INICIO_DETALHAMENTO)
+        
+        # Detalhamento por cliente (ordenado por vendedor em ordem alfabética): só a primeira página
+        # vai no HTML; o restante é buscado sob demanda conforme a rolagem
+        ordem = _ordem_detalhamento(df_inadimplencia, base_nomes)
+        total_detalhe = len(ordem)
+        linhas = _linhas_detalhamento(df_inadimplencia, ordem[:DETALHE_PAGINA], base_nomes, obs_por_cliente)
+        cabecalho = "".join(partes)
+        
+        rodape = _TPL_RODAPE_RELATORIO.render(
+            exibidos=len(linhas),
+            total=total_detalhe,
+            limite=DETALHE_PAGINA,
+            exibidos_fmt=f"{len(linhas):,}",
+            total_fmt=f"{total_detalhe:,}",
+            hoje_iso=hoje.strftime('%Y-%m-%d'),
+            gerado_em=hoje.strftime('%d/%m/%Y às %H:%M'),
+            versao_js=_VERSAO_JS,
+        )
         
-        return html_content
+        # Partes já em UTF-8: codificadas uma única vez e reaproveitadas pelo gzip, pela resposta e pelo cache
+        def _stream():
+            yield cabecalho.encode('utf-8')
+            for i in range(0, len(linhas), HTML_STREAM_BATCH):
+                yield ''.join(linhas[i:i + HTML_STREAM_BATCH]).encode('utf-8')
+            yield rodape.encode('utf-8')
+        return _stream()
         
     except Exception as e:
         logger.error(f"❌ Erro ao gerar HTML: {e}")
         return None
 
+def comprimir_stream_gzip(partes, nivel=GZIP_LEVEL):
+    """Comprime um gerador de partes (bytes UTF-8) em gzip sem juntá-lo em memória.
+    Cada parte sai com Z_SYNC_FLUSH, então o navegador já consegue descomprimir e renderizar o que chegou.
+    """
+    comp = zlib.compressobj(nivel, zlib.DEFLATED, 31)  # wbits=31 => cabeçalho/trailer gzip
+    for parte in partes:
+        dados = comp.compress(parte) + comp.flush(zlib.Z_SYNC_FLUSH)
+        if dados:
+            yield dados
+    yield comp.flush()
+
+def chave_relatorio(df_inadimplencia, df_metricas, observacoes, periodo=None):
+    """Hash do conteúdo que determina o relatório (dados, métricas, observações por cliente, data de hoje e
+    versões do JS/CSS referenciados pela página, para um deploy novo não receber 304 com HTML de ?v= antigo).
+    Retorna None se não for possível calcular (o relatório é gerado sem cache).
+    """
+    try:
+        h = hashlib.blake2b(digest_size=16)
+        h.update(pd.util.hash_pandas_object(df_inadimplencia, index=True).to_numpy().tobytes())
+        h.update(pd.util.hash_pandas_object(df_metricas, index=True).to_numpy().tobytes())
+        codigos = sorted(str(o.get('codigo_vendedor', '')).strip() for o in (observacoes or []))
+        h.update(json.dumps(codigos).encode('utf-8'))
+        h.update((periodo or periodo_relatorio()).hoje.strftime('%Y-%m-%d').encode('ascii'))
+        h.update(f"{_VERSAO_JS}|{_VERSAO_CSS}".encode('ascii'))
+        return h.hexdigest()
+    except Exception as e:
+        logger.warning(f"⚠️ Não foi possível calcular a chave do cache do relatório: {e}")
+        return None
+
+def chave_rapida_relatorio(observacoes, periodo=None):
+    """Chave barata das entradas do relatório (assinatura do arquivo, quantidade e última observação, dia,
+    versões do JS/CSS).
+    Retorna None se não houver arquivo ou não for possível calcular.
+    """
+    try:
+        arquivo_excel = localizar_arquivo_inadimplencia()
+        if not arquivo_excel:
+            return None
+        observacoes = observacoes or []
+        ultima_obs = max((str(o.get('data_envio', '')) for o in observacoes), default='')
+        return (assinatura_arquivo(arquivo_excel), len(observacoes), ultima_obs,
+                (periodo or periodo_relatorio()).hoje.strftime('%Y-%m-%d'), _VERSAO_JS, _VERSAO_CSS)
+    except Exception as e:
+        logger.warning(f"⚠️ Não foi possível calcular a chave rápida do relatório: {e}")
+        return None
+
+def _obter_relatorio_rapido(chave_rapida):
+    """HTML em cache do último relatório com a mesma chave rápida (ou None)."""
+    if chave_rapida is None:
+        return None
+    with _HTML_CACHE_LOCK:
+        if _RELATORIO_RAPIDO['chave_rapida'] != chave_rapida:
+            return None
+        chave = _RELATORIO_RAPIDO['chave']
+    return _obter_html_cache(chave)
+
+def _associar_relatorio_rapido(chave_rapida, chave):
+    """Aponta a chave rápida para a chave de conteúdo (chamar com _HTML_CACHE_LOCK adquirido)."""
+    if chave_rapida is not None:
+        _RELATORIO_RAPIDO['chave_rapida'] = chave_rapida
+        _RELATORIO_RAPIDO['chave'] = chave
+
+def invalidar_relatorio_rapido():
+    """Descarta o atalho da chave rápida (novo upload ou nova observação)."""
+    with _HTML_CACHE_LOCK:
+        _RELATORIO_RAPIDO['chave_rapida'] = None
+        _RELATORIO_RAPIDO['chave'] = None
+
+def _obter_html_cache(chave):
+    """Entrada do cache ({'html': bytes, 'gzip': bytes|None, 'etag': chave}) ou None."""
+    if chave is None:
+        return None
+    with _HTML_CACHE_LOCK:
+        entrada = _HTML_CACHE.get(chave)
+        if entrada is not None:
+            _HTML_CACHE.move_to_end(chave)
+        return entrada
+
+def _guardar_html_cache(chave, partes, chave_rapida=None):
+    """Repassa as partes do relatório e, ao final do streaming, guarda o HTML completo no cache
+    (e associa a chave rápida, se informada, à chave de conteúdo).
+    """
+    enviadas = []
+    for parte in partes:
+        enviadas.append(parte)
+        yield parte
+    if chave is None:
+        return
+    with _HTML_CACHE_LOCK:
+        _HTML_CACHE[chave] = {'html': b"".join(enviadas), 'gzip': None, 'etag': chave}
+        _HTML_CACHE.move_to_end(chave)
+        while len(_HTML_CACHE) > HTML_CACHE_MAX:
+            _HTML_CACHE.popitem(last=False)
+        _associar_relatorio_rapido(chave_rapida, chave)
+
+def _validar_com_etag(resp, chave):
+    """ETag fraco = chave de conteúdo do relatório; o navegador revalida a cada acesso (no-cache)
+    e recebe 304 sem corpo enquanto dados, observações e dia não mudarem.
+    """
+    if chave is None:
+        return resp
+    resp.set_etag(chave, weak=True)
+    resp.cache_control.no_cache = True
+    return resp
+
+def relatorio_nao_modificado(chave):
+    """304 se o navegador já tem o relatório desta chave de conteúdo (If-None-Match); senão None.
+    Vale também para um worker que ainda não tem o HTML em cache: nada é gerado nem enviado.
+    """
+    if chave is None or not request.if_none_match.contains_weak(chave):
+        return None
+    resp = Response(status=304)
+    resp.headers['Vary'] = 'Accept-Encoding'
+    return _validar_com_etag(resp, chave)
+
+def resposta_html_cache(entrada):
+    """Resposta a partir do HTML em cache (gzip comprimido uma vez e reaproveitado; 304 se o ETag bater)."""
+    if request.accept_encodings['gzip']:
+        if entrada['gzip'] is None:
+            comp = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+            entrada['gzip'] = comp.compress(entrada['html']) + comp.flush()
+        resp = Response(entrada['gzip'], mimetype='text/html')
+        resp.headers['Content-Encoding'] = 'gzip'
+    else:
+        resp = Response(entrada['html'], mimetype='text/html')
+    resp.headers['Vary'] = 'Accept-Encoding'
+    return _validar_com_etag(resp, entrada.get('etag')).make_conditional(request)
+
+def resposta_html_stream(partes, chave=None):
+    """Monta a resposta em streaming do relatório, comprimida em gzip quando o cliente aceita."""
+    if request.accept_encodings['gzip']:
+        resp = Response(stream_with_context(comprimir_stream_gzip(partes)), mimetype='text/html')
+        resp.headers['Content-Encoding'] = 'gzip'
+    else:
+        resp = Response(stream_with_context(partes), mimetype='text/html')
+    resp.headers['Vary'] = 'Accept-Encoding'
+    return _validar_com_etag(resp, chave)
+
+@app.after_request
+def cache_estaticos_versionados(resp):
+    """Cache longo para estáticos pedidos com ?v= (versão pelo conteúdo)"""
+    if request.path.startswith('/static/') and request.args.get('v') and resp.status_code == 200:
+        resp.cache_control.public = True
+        resp.cache_control.max_age = ESTATICO_MAX_AGE
+        resp.cache_control.immutable = True
+        resp.cache_control.no_cache = None
+    return resp
+
+@app.after_request
+def comprimir_resposta(resp):
+    """Gzip para respostas JSON grandes e estáticos JS/CSS quando o cliente aceita (HTML em linhas de tabela comprime dezenas de vezes)"""
+    estatico = request.path.startswith('/static/')
+    if (resp.mimetype not in GZIP_MIMETYPES or resp.status_code != 200 or (resp.direct_passthrough and not estatico)
+            or (resp.is_streamed and not estatico) or 'Content-Encoding' in resp.headers
+            or not request.accept_encodings['gzip']):
+        return resp
+    if estatico:
+        # Arquivo servido por send_file: comprimido uma vez por versão (ETag do arquivo) e reaproveitado
+        chave = (request.path, resp.get_etag()[0])
+        comprimido = _ESTATICOS_GZ.get(chave)
+        if comprimido is None:
+            resp.direct_passthrough = False
+            dados = resp.get_data()
+            if len(dados) < GZIP_MIN_BYTES:
+                return resp
+            comprimido = zlib.compress(dados, 9, wbits=31)
+            _ESTATICOS_GZ[chave] = comprimido
+        resp.direct_passthrough = False
+        resp.set_data(comprimido)
+        resp.headers['Content-Encoding'] = 'gzip'
+        resp.vary.add('Accept-Encoding')
+        return resp
+    dados = resp.get_data()
+    if len(dados) < GZIP_MIN_BYTES:
+        return resp
+    comp = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    resp.set_data(comp.compress(dados) + comp.flush())
+    resp.headers['Content-Encoding'] = 'gzip'
+    resp.vary.add('Accept-Encoding')
+    return resp
+
 @app.route('/')
 def relatorio_geral():
     """Página principal do relatório"""
     try:
+        # Upload recém-enviado ainda em processamento: página de espera em vez de processar em paralelo
+        if upload_em_processamento():
+            return gerar_pagina_processando()
+        
+        # Período calculado uma vez: chaves de cache, dados e HTML usam as mesmas datas
+        periodo = periodo_relatorio()
+        
+        # Carregar observações
+        observacoes = carregar_observacoes()
+        
+        # Mesmo arquivo (mtime), mesmas observações e mesmo dia: HTML direto do cache, sem ler a planilha
+        chave_rapida = chave_rapida_relatorio(observacoes, periodo)
+        em_cache = _obter_relatorio_rapido(chave_rapida)
+        if em_cache is not None:
+            return resposta_html_cache(em_cache)
+        
         # Obter dados de inadimplência
-        df_inadimplencia = obter_dados_inadimplencia()
+        df_inadimplencia = obter_dados_inadimplencia(periodo)
         if df_inadimplencia is None:
             # Se não há dados, mostrar página de upload
             return gerar_pagina_upload()
@@ -1764,15 +2386,23 @@ def relatorio_geral():
         if df_metricas is None:
             return "❌ Erro ao calcular métricas", 500
         
-        # Carregar observações
-        observacoes = carregar_observacoes()
+        # Mesmo conteúdo => mesmo HTML: servir do cache quando possível
+        chave = chave_relatorio(df_inadimplencia, df_metricas, observacoes, periodo)
+        nao_modificado = relatorio_nao_modificado(chave)
+        if nao_modificado is not None:
+            return nao_modificado
+        em_cache = _obter_html_cache(chave)
+        if em_cache is not None:
+            with _HTML_CACHE_LOCK:
+                _associar_relatorio_rapido(chave_rapida, chave)
+            return resposta_html_cache(em_cache)
         
-        # Gerar HTML
-        html_content = gerar_html_relatorio(df_inadimplencia, df_metricas, observacoes)
-        if html_content is None:
+        # Gerar HTML (enviado em partes conforme é produzido e guardado no cache ao final)
+        html_stream = gerar_html_relatorio(df_inadimplencia, df_metricas, observacoes, periodo)
+        if html_stream is None:
             return "❌ Erro ao gerar relatório", 500
         
-        return html_content
+        return resposta_html_stream(_guardar_html_cache(chave, html_stream, chave_rapida), chave)
         
     except Exception as e:
         logger.error(f"❌ Erro na página principal: {e}")
@@ -1792,7 +2422,8 @@ def salvar_observacao_route():
         if not dados or not all(k in dados for k in ['nome_vendedor', 'codigo_vendedor', 'observacao', 'data_observacao']):
             return jsonify({'success': False, 'error': 'Dados incompletos'})
         
-        # Salvar observação
+        # Salvar observação (o relatório em cache deixa de valer)
+        invalidar_relatorio_rapido()
         if salvar_observacao(dados):
             return jsonify({'success': True})
         else:
@@ -1817,26 +2448,61 @@ def observacoes_por_cliente(codigo):
     """Retorna observações filtradas por código de cliente"""
     try:
         codigo = str(codigo)
-        obs = [o for o in carregar_observacoes() if str(o.get('codigo_vendedor', '')) == codigo]
-        return jsonify({'success': True, 'observacoes': obs})
+        # Sem JSON local nem Gist o DB é a fonte: busca só as linhas do cliente em vez de carregar todas
+        obs = None
+        sem_arquivo = not os.path.exists(OBSERVACOES_FILE) and not os.path.exists(OBSERVACOES_FILE_LEGADO)
+        if sem_arquivo and not (GIST_TOKEN and GIST_ID):
+            obs = observacoes_do_cliente_db(codigo)
+        if obs is None:
+            obs = observacoes_do_cliente(carregar_observacoes(), codigo)
+        # ETag do conteúdo: o navegador revalida a cada abertura do modal e recebe 304 se nada mudou
+        resp = jsonify({'success': True, 'observacoes': obs})
+        resp.set_etag(hashlib.blake2b(resp.get_data(), digest_size=16).hexdigest(), weak=True)
+        resp.cache_control.no_cache = True
+        return resp.make_conditional(request)
     except Exception as e:
         logger.error(f"❌ Erro ao listar observações do cliente {codigo}: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/linhas_detalhamento')
+def api_linhas_detalhamento():
+    """Página de linhas do detalhamento (HTML pronto) com os filtros da tela, para a rolagem incremental"""
+    try:
+        df_inadimplencia = obter_dados_inadimplencia()
+        if df_inadimplencia is None:
+            return jsonify({'success': False, 'error': 'Nenhum dado carregado'}), 404
+
+        offset = max(0, request.args.get('offset', 0, type=int))
+        limit = min(max(1, request.args.get('limit', DETALHE_PAGINA, type=int)), DETALHE_PAGINA_MAX)
+        base_nomes = _coluna_nome_vendedor(df_inadimplencia)
+        ordem = _filtrar_detalhamento(
+            df_inadimplencia, _ordem_detalhamento(df_inadimplencia, base_nomes), base_nomes,
+            vendedor=request.args.get('vendedor', ''),
+            status=request.args.get('status', ''),
+            valor_min=request.args.get('valor_min', type=float)
+        )
+        pagina = ordem[offset:offset + limit]
+        linhas = _linhas_detalhamento(
+            df_inadimplencia, pagina, base_nomes, _contar_obs_por_cliente(carregar_observacoes())
+        )
+        return jsonify({'success': True, 'html': "".join(linhas), 'total': int(len(ordem)), 'proximo': offset + len(pagina)})
+    except Exception as e:
+        logger.error(f"❌ Erro ao buscar linhas do detalhamento: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/db_health')
 def db_health():
     """Healthcheck de conexão com o Postgres (Neon)."""
     try:
         logger.info("🔍 /db_health: testando conexão DB...")
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'ok': False, 'error': 'Sem conexão. Verifique DATABASE_URL/SSL e rede.'}), 500
-        with conn.cursor() as cur:
-            cur.execute('SELECT 1')
-            _ = cur.fetchone()
-            cur.execute('SELECT version()')
-            version = cur.fetchone()[0]
-        conn.close()
+        with conexao_db() as conn:
+            if not conn:
+                return jsonify({'ok': False, 'error': 'Sem conexão. Verifique DATABASE_URL/SSL e rede.'}), 500
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+                _ = cur.fetchone()
+                cur.execute('SELECT version()')
+                version = cur.fetchone()[0]
         logger.info("✅ /db_health: conexão OK")
         return jsonify({'ok': True, 'version': version})
     except Exception as e:
@@ -1854,8 +2520,8 @@ def gist_health():
         }
         if not GIST_TOKEN or not GIST_ID:
             return jsonify({'ok': False, 'error': 'GIST_TOKEN ou GIST_ID ausente', **info}), 400
-        headers = {"Authorization": f"token {GIST_TOKEN}", "Accept": "application/vnd.github+json"}
-        r = requests.get(f"https://api.github.com/gists/{GIST_ID}", headers=headers, timeout=15)
+        headers = {"Authorization": f"token {GIST_TOKEN}"}
+        r = _HTTP.get(f"https://api.github.com/gists/{GIST_ID}", headers=headers, timeout=15)
         info['status_code'] = r.status_code
         if r.status_code != 200:
             return jsonify({'ok': False, 'error': f'status {r.status_code}', **info}), 502
@@ -1888,10 +2554,33 @@ def upload_arquivo():
             return jsonify({'success': False, 'error': 'Nenhum arquivo selecionado'})
         
         if arquivo and allowed_file(arquivo.filename):
-            # Salvar arquivo
-            filename = "INADIMPLENCIA GERAL.xlsx"
+            # Salvar arquivo mantendo a extensão real (o leitor escolhe o formato pela extensão)
+            ext = arquivo.filename.rsplit('.', 1)[1].lower()
+            filename = f"INADIMPLENCIA GERAL.{ext}"
             filepath = os.path.join(UPLOAD_FOLDER, filename)
-            arquivo.save(filepath)
+            # Cópia em blocos de 1 MiB para um temporário e troca atômica: quem lê o Excel (outra thread/worker,
+            # o pré-processamento) nunca vê o arquivo pela metade
+            temporario = _caminho_temporario(filepath)
+            try:
+                with open(temporario, 'wb') as destino:
+                    shutil.copyfileobj(arquivo.stream, destino, UPLOAD_BUFFER)
+                os.replace(temporario, filepath)
+            except Exception:
+                if os.path.exists(temporario):
+                    os.remove(temporario)
+                raise
+            _DADOS_CACHE.clear()
+            _METRICAS_CACHE.clear()
+            invalidar_relatorio_rapido()
+            # Remover a versão com a outra extensão para não haver dois arquivos candidatos
+            for outra in ALLOWED_EXTENSIONS - {ext}:
+                antigo = os.path.join(UPLOAD_FOLDER, f"INADIMPLENCIA GERAL.{outra}")
+                if os.path.exists(antigo):
+                    os.remove(antigo)
+            
+            # Converter para Parquet e calcular dados/métricas em segundo plano: a resposta volta na hora
+            # e o recarregamento da página encontra os caches prontos (ou a página de espera)
+            iniciar_preprocessamento_upload(filepath)
             
             logger.info(f"✅ Arquivo {filename} enviado com sucesso")
             return jsonify({'success': True, 'message': 'Arquivo enviado com sucesso!'})
@@ -1932,7 +2621,7 @@ def download_template():
 
 def abrir_navegador():
     """Abre o navegador automaticamente"""
-    import time
+    import webbrowser
     time.sleep(2)  # Aguarda o servidor iniciar
     webbrowser.open('http://localhost:5000')
 
@@ -1957,9 +2646,19 @@ if __name__ == '__main__':
 
     if os.environ.get('RENDER'):  # Está no Render
         print("🌐 Modo Produção - Render.com")
-        app.run(host='0.0.0.0', port=port, debug=False)
+        # Mesmo servidor do Procfile (gunicorn, workers com threads); o servidor do Flask só se ele não estiver instalado
+        try:
+            os.execvp('gunicorn', [
+                'gunicorn', 'app:app', '--bind', f'0.0.0.0:{port}',
+                '--workers', os.environ.get('WEB_CONCURRENCY', '2'),
+                '--worker-class', 'gthread', '--threads', str(THREADS_POR_WORKER), '--preload',
+            ])
+        except OSError as e:
+            logger.warning(f"⚠️ gunicorn indisponível ({e}); usando o servidor do Flask")
+            app.run(host='0.0.0.0', port=port, debug=False, threaded=True)
     else:  # Modo desenvolvimento local
         print("💻 Modo Desenvolvimento Local")
         # Abrir navegador automaticamente
         threading.Thread(target=abrir_navegador, daemon=True).start()
-        app.run(host='0.0.0.0', port=port, debug=False)
+        # Uma thread por requisição: um relatório demorado não segura /ping nem as chamadas da API
+        app.run(host='0.0.0.0', port=port, debug=False, threaded=True)
@@ -0,0 +1,287 @@
+// Script do relatório de inadimplência (servido como arquivo estático e mantido em cache pelo navegador).
+// Valores que dependem do relatório vêm de data-* no HTML (ex.: #detalhe-mais).
+// Texto digitado por usuários (observações, nomes) só entra no innerHTML escapado, numa única passada de replace
+const HTML_ESCAPE = { '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;' };
+function escaparHtml(texto) {
+    return String(texto).replace(/[&<>"']/g, c => HTML_ESCAPE[c]);
+}
+// Upload embutido no cabeçalho (evita f-string dentro do atributo onsubmit)
+(function(){
+    const form = document.getElementById('uploadFormInline');
+    if (form) {
+        form.addEventListener('submit', function(e) {
+            e.preventDefault();
+            const fileInput = document.getElementById('arquivoInline');
+            if (!fileInput || fileInput.files.length === 0) {
+                alert('Selecione um arquivo.');
+                return;
+            }
+            const fd = new FormData(form);
+            fetch('/upload', { method: 'POST', body: fd })
+                .then(r => r.json())
+                .then(d => { if (d.success) { location.reload(); } else { alert('Erro: ' + d.error); } })
+                .catch(err => alert('Erro no upload: ' + err));
+        });
+    }
+})();
+// Botões "Obs": um único listener na tabela (delegação) lê código e nome dos data-* do botão
+document.getElementById('tabela-detalhamento').addEventListener('click', function(e) {
+    const btn = e.target.closest('.btn-obs');
+    if (btn) {
+        openObsModal(btn.dataset.cod, btn.dataset.nome);
+    }
+});
+// ---- Detalhamento paginado: a primeira página vem no HTML, as seguintes via /api/linhas_detalhamento ----
+const detalheMais = document.getElementById('detalhe-mais');
+const detalhe = {
+    offset: Number(detalheMais.dataset.offset),
+    total: Number(detalheMais.dataset.total),
+    limite: Number(detalheMais.dataset.limite),
+    filtros: {}, seq: 0, carregando: false
+};
+function atualizarInfoDetalhe() {
+    document.getElementById('detalhe-info').textContent =
+        `Exibindo ${detalhe.offset.toLocaleString('en-US')} de ${detalhe.total.toLocaleString('en-US')} títulos`;
+    document.getElementById('btn-carregar-mais').style.display = detalhe.offset < detalhe.total ? '' : 'none';
+}
+function carregarDetalhes(reiniciar) {
+    if (!reiniciar && (detalhe.carregando || detalhe.offset >= detalhe.total)) return;
+    // Cada busca recebe um número: respostas de buscas substituídas (ex.: filtro trocado) são descartadas
+    const seq = ++detalhe.seq;
+    const params = new URLSearchParams(detalhe.filtros);
+    params.set('offset', reiniciar ? 0 : detalhe.offset);
+    params.set('limit', detalhe.limite);
+    detalhe.carregando = true;
+    fetch('/api/linhas_detalhamento?' + params.toString())
+        .then(r => r.json())
+        .then(d => {
+            if (seq !== detalhe.seq) return;
+            if (!d.success) throw new Error(d.error || 'falha na busca');
+            const tbody = document.querySelector('#tabela-detalhamento tbody');
+            if (reiniciar) tbody.innerHTML = '';
+            tbody.insertAdjacentHTML('beforeend', d.html);
+            detalhe.offset = d.proximo;
+            detalhe.total = d.total;
+            atualizarInfoDetalhe();
+        })
+        .catch(err => {
+            if (seq === detalhe.seq) document.getElementById('detalhe-info').textContent = 'Erro ao carregar títulos: ' + err;
+        })
+        .finally(() => {
+            if (seq === detalhe.seq) detalhe.carregando = false;
+        });
+}
+// Próxima página ao rolar perto do fim da tabela
+if ('IntersectionObserver' in window) {
+    new IntersectionObserver(entradas => {
+        if (entradas.some(e => e.isIntersecting)) carregarDetalhes(false);
+    }, { rootMargin: '600px' }).observe(document.getElementById('detalhe-mais'));
+}
+// ---- fim detalhamento paginado ----
+// Filtros aplicados ao mudar: selects na hora; o valor digitado espera uma pausa na digitação
+// (cada aplicação refaz o resumo e busca o detalhamento no servidor)
+let filtroTimer = null;
+function aplicarFiltrosDebounced() {
+    clearTimeout(filtroTimer);
+    filtroTimer = setTimeout(aplicarFiltros, 300);
+}
+['filtro-vendedor', 'filtro-status', 'filtro-dias'].forEach(id => {
+    document.getElementById(id).addEventListener('change', aplicarFiltros);
+});
+document.getElementById('filtro-valor').addEventListener('input', aplicarFiltrosDebounced);
+// ---- Observações por Cliente (modal) ----
+let obsModalCodigoAtual = null;
+function openObsModal(codigo, nome) {
+    obsModalCodigoAtual = String(codigo);
+    document.getElementById('obsClienteCodigo').textContent = obsModalCodigoAtual;
+    document.getElementById('obsClienteNome').textContent = nome;
+    document.getElementById('obsCodigoCliente').value = obsModalCodigoAtual;
+    document.getElementById('obsModal').style.display = 'flex';
+    carregarObsDoCliente(obsModalCodigoAtual);
+}
+function closeObsModal() {
+    document.getElementById('obsModal').style.display = 'none';
+}
+function carregarObsDoCliente(codigo) {
+    fetch('/observacoes_por_cliente/' + encodeURIComponent(codigo))
+        .then(r => r.json())
+        .then(data => {
+            const listaDiv = document.getElementById('obsLista');
+            if (!data.success) {
+                listaDiv.innerHTML = '<div class="info-observacao">Erro ao carregar observações.</div>';
+                return;
+            }
+            const obs = data.observacoes || [];
+            if (obs.length === 0) {
+                listaDiv.innerHTML = '<div class="info-observacao">Nenhuma observação para este cliente.</div>';
+            } else {
+                listaDiv.innerHTML = obs.slice().reverse().map(o => {
+                    // Registros novos já trazem a data formatada; os antigos são formatados aqui
+                    let d = o.data_envio_fmt;
+                    if (!d) {
+                        d = o.data_envio || o.data_observacao;
+                        try { d = new Date(d).toLocaleString('pt-BR'); } catch (e) {}
+                    }
+                    return `<div class="observacao-item">`
+                        + `<div class=\"observacao-header\">`
+                        + `<span class=\"observacao-vendedor\">${escaparHtml(o.nome_vendedor || '-')}` + `</span>`
+                        + `<span class=\"observacao-data\">${escaparHtml(d || '')}</span>`
+                        + `</div>`
+                        + `<div class=\"observacao-texto\">${escaparHtml(o.observacao || '')}</div>`
+                        + `</div>`;
+                }).join('');
+            }
+            atualizarBadge(codigo, obs.length);
+        })
+        .catch(_ => {
+            document.getElementById('obsLista').innerHTML = '<div class="info-observacao">Erro ao carregar observações.</div>';
+        });
+}
+function salvarObsDoCliente(event) {
+    event.preventDefault();
+    const dados = {
+        nome_vendedor: document.getElementById('obsNomeVendedor').value,
+        codigo_vendedor: document.getElementById('obsCodigoCliente').value,
+        observacao: document.getElementById('obsTexto').value,
+        data_observacao: document.getElementById('obsData').value
+    };
+    fetch('/salvar_observacao', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(dados),
+        keepalive: true  // conclui o envio mesmo se a página for fechada logo após salvar
+    })
+    .then(r => r.json())
+    .then(d => {
+        if (d.success) {
+            document.getElementById('obsTexto').value = '';
+            carregarObsDoCliente(obsModalCodigoAtual);
+        } else {
+            alert('❌ Erro ao salvar observação: ' + (d.error || ''));
+        }
+    })
+    .catch(err => alert('❌ Erro ao salvar observação: ' + err));
+}
+function atualizarBadge(codigo, count) {
+    const badge = document.getElementById('obs-badge-' + codigo);
+    if (!badge) return;
+    const n = Number(count || 0);
+    if (n > 0) {
+        badge.textContent = n;
+        badge.style.display = 'inline-block';
+    } else {
+        badge.style.display = 'none';
+    }
+}
+// ---- fim observações por cliente ----
+
+// Funções de filtro
+function aplicarFiltros() {
+    const vendedor = document.getElementById('filtro-vendedor').value;
+    const status = document.getElementById('filtro-status').value;
+    const dias = document.getElementById('filtro-dias').value;
+    const valor = document.getElementById('filtro-valor').value;
+
+    // Mostrar informações do filtro ativo
+    let filtrosAtivos = [];
+    if (vendedor) filtrosAtivos.push(`Vendedor: ${escaparHtml(vendedor)}`);
+    if (status) filtrosAtivos.push(`Status: ${escaparHtml(status)}`);
+    if (dias) filtrosAtivos.push(`Dias: ${dias}`);
+    if (valor) filtrosAtivos.push(`Valor mínimo: R$ ${parseFloat(valor).toFixed(2)}`);
+
+    const filtroInfo = document.getElementById('filtro-ativo-info');
+    if (filtrosAtivos.length > 0) {
+        filtroInfo.innerHTML = `<div class="filtro-ativo"><strong>Filtros Ativos:</strong> ${filtrosAtivos.join(' | ')}</div>`;
+        filtroInfo.style.display = 'block';
+    } else {
+        filtroInfo.style.display = 'none';
+    }
+
+    // Aplicar filtros nas tabelas
+    filtrarTabelaResumo(vendedor, status, dias, valor);
+    filtrarTabelaDetalhamento(vendedor, status, valor);
+}
+
+function limparFiltros() {
+    document.getElementById('filtro-vendedor').value = '';
+    document.getElementById('filtro-status').value = '';
+    document.getElementById('filtro-dias').value = '';
+    document.getElementById('filtro-valor').value = '';
+    document.getElementById('filtro-ativo-info').style.display = 'none';
+
+    // Mostrar todas as linhas
+    linhasResumo().forEach(l => l.linha.classList.remove('oculta'));
+
+    filtrarTabelaDetalhamento('', '', '');
+}
+
+// Linhas do resumo consultadas uma única vez (a tabela não muda depois do carregamento)
+// Linhas do resumo com os data-* já interpretados (lidos uma vez, não a cada aplicação de filtro)
+let linhasResumoCache = null;
+function linhasResumo() {
+    if (linhasResumoCache === null) {
+        const tabela = document.getElementById('tabela-resumo');
+        const linhas = tabela ? Array.from(tabela.querySelectorAll('tbody tr')) : [];
+        linhasResumoCache = linhas.map(linha => ({
+            linha: linha,
+            vendedor: linha.dataset.vendedor,
+            faixas: new Set(linha.dataset.faixas.split(' ')),
+            valor: +linha.dataset.valor
+        }));
+    }
+    return linhasResumoCache;
+}
+
+function filtrarTabelaResumo(vendedor, status, dias, valor) {
+    const linhas = linhasResumo();
+
+    // 1ª fase: só leituras (decide cada linha); 2ª fase: só escritas (classe),
+    // para o navegador recalcular o layout uma vez e não a cada linha
+    const valorMinimo = parseFloat(valor);
+    const decisoes = linhas.map(l => {
+        // Nome e números crus vêm dos data-* gerados no servidor (sem interpretar texto formatado)
+        let mostrar = true;
+
+        if (vendedor && l.vendedor !== vendedor) mostrar = false;
+        if (dias && !l.faixas.has(dias)) mostrar = false;
+        if (valor && l.valor < valorMinimo) mostrar = false;
+
+        return mostrar;
+    });
+    linhas.forEach((l, i) => l.linha.classList.toggle('oculta', !decisoes[i]));
+}
+
+function filtrarTabelaDetalhamento(vendedor, status, valor) {
+    // Detalhamento é filtrado no servidor (nem todas as linhas estão na página): recomeça da primeira página
+    const filtros = {};
+    if (vendedor) filtros.vendedor = vendedor;
+    if (status) filtros.status = status;
+    if (valor) filtros.valor_min = valor;
+    detalhe.filtros = filtros;
+    carregarDetalhes(true);
+}
+
+// Auto-preenchimento do código do vendedor baseado na URL
+window.onload = function() {
+    const urlParams = new URLSearchParams(window.location.search);
+    const vendedor = urlParams.get('vendedor');
+    if (vendedor) {
+        const codigoVEl = document.getElementById('codigo_vendedor');
+        if (codigoVEl) { codigoVEl.value = vendedor; }
+        document.getElementById('filtro-vendedor').value = vendedor;
+        aplicarFiltros(); // Aplicar filtro automaticamente
+    }
+    // Relógio e keepalive
+    function updateClock() {
+        const el = document.getElementById('keepaliveClock');
+        if (!el) return;
+        const now = new Date();
+        const hh = String(now.getHours()).padStart(2,'0');
+        const mm = String(now.getMinutes()).padStart(2,'0');
+        const ss = String(now.getSeconds()).padStart(2,'0');
+        el.textContent = hh + ':' + mm + ':' + ss;
+    }
+    setInterval(updateClock, 1000);
+    updateClock();
+    setInterval(() => { fetch('/ping').catch(()=>{}); }, 30000);
+};
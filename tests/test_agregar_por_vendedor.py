@@ -0,0 +1,69 @@
+"""Confere _agregar_por_vendedor contra o groupby.agg que ele substitui."""
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+# O módulo cria a pasta de uploads no diretório atual ao ser importado
+os.chdir(tempfile.mkdtemp())
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import servidor_relatorio_inadimplencia as servidor  # noqa: E402
+
+
+def agregar_groupby(df, chave_cod, chave_nome):
+    """Referência: o groupby.agg usado antes do bincount."""
+    agrupado = df.groupby([chave_cod, chave_nome], sort=False, observed=True).agg({
+        'VALOR_TITULO': ['sum', 'count'],
+        'VALOR_PAGO': 'sum',
+        'DIAS_ATRASO': 'mean'
+    })
+    agrupado.columns = ['VALOR_TOTAL_INADIMPLENCIA', 'QTD_TITULOS', 'VALOR_PAGO', 'DIAS_ATRASO_MEDIO']
+    return agrupado.reset_index()
+
+
+class AgregarPorVendedorTest(unittest.TestCase):
+
+    def comparar(self, df):
+        obtido = servidor._agregar_por_vendedor(df, 'COD_VENDEDOR', 'NOME_VENDEDOR')
+        esperado = agregar_groupby(df, 'COD_VENDEDOR', 'NOME_VENDEDOR')
+        self.assertEqual(len(obtido), len(esperado))
+        for coluna in ('COD_VENDEDOR', 'NOME_VENDEDOR'):
+            self.assertEqual(obtido[coluna].astype(object).tolist(), esperado[coluna].astype(object).tolist())
+        for coluna in ('VALOR_TOTAL_INADIMPLENCIA', 'QTD_TITULOS', 'VALOR_PAGO', 'DIAS_ATRASO_MEDIO'):
+            np.testing.assert_allclose(obtido[coluna].to_numpy(dtype=float), esperado[coluna].to_numpy(dtype=float))
+
+    def dados(self, cods, nomes):
+        n = len(cods)
+        return pd.DataFrame({
+            'COD_VENDEDOR': cods,
+            'NOME_VENDEDOR': nomes,
+            'VALOR_TITULO': np.arange(1, n + 1, dtype=float) * 10,
+            'VALOR_PAGO': np.arange(n, dtype=float),
+            'DIAS_ATRASO': np.arange(n, dtype=float) * 3,
+        })
+
+    def test_mais_nomes_que_codigos(self):
+        # (A, n2) e (B, n0) não podem cair no mesmo grupo
+        self.comparar(self.dados(['A', 'B', 'A', 'B'], ['n0', 'n1', 'n2', 'n0']))
+
+    def test_chaves_nulas_descartadas(self):
+        self.comparar(self.dados(['A', None, 'B', 'A', 'B'], ['n0', 'n1', None, 'n0', 'n1']))
+
+    def test_chaves_category(self):
+        # Códigos vêm de cat.codes: a lista de categorias de nomes (com sobras não usadas) é maior que a de códigos
+        df = self.dados(['A', 'A', 'B', 'B', 'A'], ['n0', 'n2', 'n0', 'n1', 'n3'])
+        df['COD_VENDEDOR'] = df['COD_VENDEDOR'].astype(pd.CategoricalDtype(['A', 'B']))
+        df['NOME_VENDEDOR'] = df['NOME_VENDEDOR'].astype(pd.CategoricalDtype(['n0', 'n1', 'n2', 'n3', 'n4', 'n5']))
+        self.comparar(df)
+
+    def test_aleatorio(self):
+        rng = np.random.default_rng(1)
+        n = 500
+        self.comparar(self.dados(rng.choice(['A', 'B', 'C'], n), rng.choice([f'n{i}' for i in range(12)], n)))
+
+
+if __name__ == '__main__':
+    unittest.main()